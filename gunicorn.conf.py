@@ -0,0 +1,83 @@
+"""Gunicorn settings of the production run mode in start.sh, from the environment"""
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+started = time.perf_counter()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# The settings split per-process resources, like the hashing pool, by this
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+# Workers write their metrics here, so a /metrics scrape of any worker sums all
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "service-metrics")
+)
+# "uvicorn.workers.UvicornWorker" serves the ASGI application, where the
+# async read views run on the event loop.
+worker_class = os.environ.get(
+    "GUNICORN_WORKER_CLASS", "gthread" if threads > 1 else "sync"
+)
+if "uvicorn" in worker_class.lower():
+    wsgi_app = "lampatest.asgi:application"
+else:
+    wsgi_app = "lampatest.wsgi:application"
+
+# Import the project once in the master so workers share its memory
+preload_app = True
+# Replace each worker after about this many requests, against slow leaks
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# On SIGTERM workers finish their in-flight requests for up to this long
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Token versions, blacklisted tokens, response cache generations and
+    # replica pins are cached; each worker would keep its own copy.
+    from django.conf import settings
+
+    if server.cfg.workers > 1 and not settings.SHARED_CACHE:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need a shared cache, set REDIS_URL "
+            "or WEB_CONCURRENCY=1"
+        )
+    # Counts of a previous run would be added to this one's
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def when_ready(server):
+    # Django loads the URLconf, and with it every view, serializer and
+    # drf_yasg, on the first request. Do it here so forked workers share it.
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    server.log.info("Application loaded in %.2fs", time.perf_counter() - started)
+
+
+def pre_fork(server, worker):
+    # A connection opened in the master must not be shared by the workers
+    from django.db import connections
+
+    connections.close_all()
+    # Objects loaded so far are never collected, so the collector does not
+    # touch, and copy, the pages shared with the master.
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    # The histograms of a replaced worker stay in the totals, its gauges go
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -27,7 +27,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'mysecretezpass'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Debug also keeps every SQL query of a request in memory.
+DEBUG = os.environ.get("DEBUG", "").lower() in ("1", "true")
 
 ALLOWED_HOSTS = ["*"]
 
@@ -50,10 +51,14 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "src.instrumentation.InstrumentationMiddleware",
+    "src.routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     'corsheaders.middleware.CorsMiddleware',
     "django.middleware.common.CommonMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -70,7 +75,7 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "src.authentication.ClaimsJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
@@ -79,6 +84,16 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
 }
 
+# Largest list accepted by the bulk create/update endpoints
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", 1000))
+
+# Serve GET list/retrieve of /service/cabinet/ and /service/billing/ with the
+# async views, as /service/async/ always does. Other methods stay sync.
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "").lower() in ("1", "true")
+
+# OpenAPI document written by generate_schema at deploy and served outside DEBUG
+OPENAPI_SCHEMA_FILE = os.environ.get("OPENAPI_SCHEMA_FILE", BASE_DIR / "openapi.json")
+
 SWAGGER_SETTINGS = {
     "USE_SESSION_AUTH": False,
     "SECURITY_DEFINITIONS": {
@@ -93,6 +108,50 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
 }
 
+# Seconds a worker trusts its cached copy of a user's token_version.
+# With a shared cache a role or active flag change applies immediately.
+JWT_CLAIMS_VERSION_TTL = int(os.environ.get("JWT_CLAIMS_VERSION_TTL", 60))
+
+# Seconds a refresh token found not to be blacklisted is trusted without a query.
+TOKEN_BLACKLIST_NEGATIVE_TTL = int(os.environ.get("TOKEN_BLACKLIST_NEGATIVE_TTL", 30))
+
+# Send per-request query, database and view phase timings as Server-Timing.
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "1").lower() in (
+    "1",
+    "true",
+)
+
+# Bearer token required by /metrics. Without one the endpoint is only served in
+# DEBUG, and startup_audit fails.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Requests running more queries than this are logged with their most repeated one.
+N_PLUS_ONE_QUERY_THRESHOLD = int(os.environ.get("N_PLUS_ONE_QUERY_THRESHOLD", 20))
+
+# Background jobs run by the run_jobs worker, see src.jobs. A failed job is
+# retried after JOBS_RETRY_BACKOFF seconds, doubling up to JOBS_RETRY_BACKOFF_MAX,
+# and one whose worker stopped responding is run again after JOBS_LEASE_SECONDS.
+JOBS_CONCURRENCY = int(os.environ.get("JOBS_CONCURRENCY", 4))
+JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", 5))
+JOBS_RETRY_BACKOFF = float(os.environ.get("JOBS_RETRY_BACKOFF", 2))
+JOBS_RETRY_BACKOFF_MAX = float(os.environ.get("JOBS_RETRY_BACKOFF_MAX", 600))
+JOBS_LEASE_SECONDS = int(os.environ.get("JOBS_LEASE_SECONDS", 300))
+JOBS_POLL_SECONDS = float(os.environ.get("JOBS_POLL_SECONDS", 1))
+JOBS_RETENTION_DAYS = int(os.environ.get("JOBS_RETENTION_DAYS", 7))
+# /metrics reports wait and run times of the jobs finished this many seconds back
+JOBS_METRICS_WINDOW = int(os.environ.get("JOBS_METRICS_WINDOW", 300))
+# Every worker is scraped, so the job gauges are computed at most this often
+JOBS_METRICS_CACHE_SECONDS = int(os.environ.get("JOBS_METRICS_CACHE_SECONDS", 10))
+
+# archive_data moves paid invoices and done requests nobody wrote for this many
+# days to the archive tables, this many rows per transaction.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 1000))
+
+# Admin changelists count rows exactly up to this many, past it they show the
+# PostgreSQL planner's estimate instead of running a full COUNT(*).
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get("ADMIN_EXACT_COUNT_LIMIT", 10000))
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -124,6 +183,91 @@ DATABASES = {
         "PORT": os.environ.get("POSTGRES_PORT"),
     }
 }
+# Read replicas, "host" or "host:port" separated by commas, sharing the other
+# connection settings of the primary. See src.routers.PrimaryReplicaRouter.
+REPLICA_DATABASES = []
+for number, address in enumerate(
+    filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(","))
+):
+    host, _, port = address.strip().partition(":")
+    alias = f"replica{number + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(alias)
+# The primary under a second alias, unused unless listed in REPLICA_DATABASES.
+# The replica routing tests send reads to it.
+DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+DATABASE_ROUTERS = ["src.routers.PrimaryReplicaRouter"]
+
+# Seconds a user's reads stay on the primary after they write, and the longest
+# replica lag tolerated: cached responses read from a replica right after a
+# write expire after this long.
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+# Every gunicorn worker, the run_jobs worker and management commands have to
+# see each other's response cache generations, token versions, blacklisted
+# tokens and replica pins, so deployments set REDIS_URL (docker-compose does).
+# The in-memory fallback is only right for a single process.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if os.environ.get("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL"),
+    }
+SHARED_CACHE = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+# Cached cabinet/billing responses are only dropped by writes of processes
+# sharing the cache, so they are off by default without a shared one.
+RESPONSE_CACHE_ENABLED = os.environ.get(
+    "RESPONSE_CACHE_ENABLED", "1" if SHARED_CACHE else ""
+).lower() in ("1", "true")
+# Seconds a cached cabinet/billing response may be served. Writes invalidate
+# entries right away, this only bounds how long unused entries are kept.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 300))
+
+# Seconds /service/cabinet/facets/ counts are cached; writes invalidate them sooner.
+FACETS_CACHE_TIMEOUT = int(os.environ.get("FACETS_CACHE_TIMEOUT", 30))
+
+# Tombstones of deleted rows are pruned after this many days (prune_changes);
+# sync tokens older than that are rejected and clients fetch everything again.
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", 30))
+
+PASSWORD_HASHERS = [
+    "src.hashers.TunedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Work factor of new and rehashed passwords, Django's default when unset
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 390000))
+
+# Threads hashing and verifying passwords in each process, and how many more
+# calls may wait for one before logins and registrations are rejected with 503.
+# The cores are split between the WEB_CONCURRENCY server processes, which
+# gunicorn.conf.py sets. A process only has calls waiting, and so rejects any,
+# when it serves requests concurrently: gthread workers or ASGI. Sync workers
+# handle one login each and queue the rest in gunicorn's backlog.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+HASHING_POOL_SIZE = int(
+    os.environ.get(
+        "HASHING_POOL_SIZE", max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+    )
+)
+HASHING_QUEUE_LIMIT = int(os.environ.get("HASHING_QUEUE_LIMIT", 2 * HASHING_POOL_SIZE))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -157,6 +301,8 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = "static/"
+# Collected by start.sh and served by WhiteNoise outside runserver
+STATIC_ROOT = BASE_DIR / "staticfiles"
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -4,22 +4,32 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from src.instrumentation import metrics
+from src.schema import precomputed_schema_view
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Mobile Service Endpoints",
-        default_version="v1",
-        description="Mobile Service",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="yurasblv.y@gmail.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
+
+# Served from memory outside DEBUG, see src.schema. With no url the document
+# carries no host, so Swagger UI calls the host that served it.
+schema_view = precomputed_schema_view(
+    get_schema_view(
+        openapi.Info(
+            title="Mobile Service Endpoints",
+            default_version="v1",
+            description="Mobile Service",
+            terms_of_service="https://www.google.com/policies/terms/",
+            contact=openapi.Contact(email="yurasblv.y@gmail.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=[permissions.AllowAny],
+        url="",
+    )
 )
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics, name="metrics"),
     path("", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
+    path("service/async/", include("src.async_urls")),
     path("service/", include("src.urls")),
 ]
@@ -0,0 +1,230 @@
+"""
+Finished requests and paid invoices moved out of the hot tables into archive
+tables, and read back from them with ``?include_archived=true``
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.response import Response
+
+from src import billing
+from src.cache import invalidate
+from src.models import ArchivedInvoice, ArchivedRequest, Change, Invoice, Request
+
+
+def recently_changed(kind, cutoff):
+    """Ids of rows of ``kind`` written since ``cutoff``, from the change log"""
+    return Change.objects.filter(
+        kind=kind, deleted=False, created_at__gte=cutoff
+    ).values("object_id")
+
+
+def archivable_invoices(cutoff):
+    """Paid invoices not written since ``cutoff``"""
+    return Invoice.objects.filter(status=Invoice.Statuses.PAID).exclude(
+        pk__in=recently_changed(Change.Kinds.INVOICE, cutoff)
+    )
+
+
+def archivable_requests(cutoff):
+    """Done requests not written since ``cutoff`` and left without hot invoices"""
+    return (
+        Request.objects.filter(status=Request.Statuses.DONE)
+        .exclude(pk__in=recently_changed(Change.Kinds.REQUEST, cutoff))
+        .filter(~Exists(Invoice.objects.filter(request=OuterRef("pk"))))
+    )
+
+
+def move_invoices(invoices):
+    customers = dict(
+        Request.objects.filter(
+            pk__in={invoice.request_id for invoice in invoices}
+        ).values_list("pk", "customer_id")
+    )
+    ArchivedInvoice.objects.bulk_create(
+        ArchivedInvoice(
+            id=invoice.pk,
+            price=invoice.price,
+            status=invoice.status,
+            request_id=invoice.request_id,
+            customer_id=customers[invoice.request_id],
+            version=invoice.version,
+        )
+        for invoice in invoices
+    )
+    remove_hot_rows(Invoice, invoices)
+    invalidate(Invoice)
+
+
+def move_requests(requests):
+    ArchivedRequest.objects.bulk_create(
+        ArchivedRequest(
+            id=request.pk,
+            status=request.status,
+            phone_model=request.phone_model,
+            problem_description=request.problem_description,
+            customer_id=request.customer_id,
+            version=request.version,
+        )
+        for request in requests
+    )
+    remove_hot_rows(Request, requests)
+    invalidate(Request, {request.customer_id for request in requests})
+
+
+def remove_hot_rows(model, instances):
+    """
+    Delete archived rows from ``model`` with a plain DELETE, bypassing the
+    delete signals: the rows live on, so the billing summary keeps counting
+    them and no tombstone tells clients to drop them. Their change log entries
+    go. Nothing cascades, the rows moved have no dependants left.
+    """
+    ids = [instance.pk for instance in instances]
+    kind = Change.Kinds.REQUEST if model is Request else Change.Kinds.INVOICE
+    Change.objects.filter(kind=kind, object_id__in=ids, deleted=False).delete()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(model._meta.pk.column)} IN "
+            f"({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+def archive(queryset, move, batch_size):
+    """
+    Move the rows of ``queryset`` in primary key order, ``batch_size`` rows
+    per transaction, and yield how many each batch moved. An interrupted run
+    keeps the batches it committed and the next run carries on from there.
+    """
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.filter(pk__gt=last)
+                .order_by("pk")
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not rows:
+                return
+            move(rows)
+        last = rows[-1].pk
+        yield len(rows)
+
+
+def archive_all(days, batch_size):
+    """
+    Archive paid invoices, then done requests, untouched for ``days``, and
+    yield (model, rows moved) per batch
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    for queryset, move in (
+        (archivable_invoices(cutoff), move_invoices),
+        (archivable_requests(cutoff), move_requests),
+    ):
+        for moved in archive(queryset, move, batch_size):
+            yield queryset.model, moved
+
+
+def table_sizes(models):
+    """Table and index bytes of ``models`` on PostgreSQL, None elsewhere"""
+    if connection.vendor != "postgresql":
+        return None
+    sizes = {}
+    with connection.cursor() as cursor:
+        for model in models:
+            table = model._meta.db_table
+            cursor.execute(
+                "SELECT pg_relation_size(%s::regclass), "
+                "pg_indexes_size(%s::regclass)",
+                [table, table],
+            )
+            sizes[table] = cursor.fetchone()
+    return sizes
+
+
+def delete_archived_invoices(request_ids):
+    """
+    Delete the archived invoices of deleted requests and take them off the
+    billing summary, as the cascade does for the hot ones
+    """
+    invoices = ArchivedInvoice.objects.filter(request_id__in=request_ids)
+    rows = (
+        invoices.values("customer_id", "status")
+        .annotate(invoice_count=Count("id"), total=Sum("price"))
+        .order_by()
+    )
+    deltas = defaultdict(lambda: [0, 0.0])
+    for row in rows:
+        deltas[row["customer_id"], row["status"]][0] -= row["invoice_count"]
+        deltas[row["customer_id"], row["status"]][1] -= row["total"]
+    if deltas:
+        invoices.delete()
+        billing.apply_deltas(deltas)
+
+
+class ArchiveReadMixin:
+    """
+    ``?include_archived=true`` on list, retrieve and facets also reads the
+    rows that ``archive_data`` moved to ``archive_model``. Lists are the union
+    of both tables, newest first; archived rows render like the serializer's
+    own through the compiled fields of ``FastListMixin``.
+    """
+
+    archive_model = None
+    include_archived_query_param = "include_archived"
+    archived_actions = ("list", "retrieve", "facets")
+
+    def includes_archived(self):
+        value = self.request.query_params.get(self.include_archived_query_param, "")
+        return self.action in self.archived_actions and value.lower() in ("1", "true")
+
+    def get_archived_queryset(self):
+        return self.archive_model.objects.all()
+
+    def get_list_queryset(self, columns):
+        queryset = super().get_list_queryset(columns)
+        if not self.includes_archived():
+            return queryset
+        archived = self.filter_queryset(self.get_archived_queryset())
+        return (
+            queryset.order_by()
+            .union(archived.values(*columns).order_by(), all=True)
+            .order_by("-id")
+        )
+
+    def get_facet_querysets(self):
+        querysets = super().get_facet_querysets()
+        if self.includes_archived():
+            querysets.append(self.filter_queryset(self.get_archived_queryset()))
+        return querysets
+
+    def get_archived_row(self):
+        """The rendered archived row of the lookup URL kwarg, or 404"""
+        compiled = self.get_fast_list_fields()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_archived_queryset())
+        try:
+            row = (
+                queryset.values(*compiled.columns)
+                .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                .first()
+            )
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            raise Http404
+        return compiled.render([row])[0]
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.includes_archived():
+                raise
+        return Response(self.get_archived_row())
@@ -0,0 +1,19 @@
+"""Router for the async read endpoints"""
+from django.urls import path
+
+from src.async_views import AsyncInvoiceView, AsyncRequestsView
+
+urlpatterns = [
+    path("cabinet/", AsyncRequestsView.as_view(action="list"), name="async-cabinet"),
+    path(
+        "cabinet/<int:pk>/",
+        AsyncRequestsView.as_view(action="retrieve"),
+        name="async-cabinet-detail",
+    ),
+    path("billing/", AsyncInvoiceView.as_view(action="list"), name="async-billing"),
+    path(
+        "billing/<int:pk>/",
+        AsyncInvoiceView.as_view(action="retrieve"),
+        name="async-billing-detail",
+    ),
+]
@@ -0,0 +1,206 @@
+"""Async list and retrieve views for the service endpoints"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from src.archive import ArchiveReadMixin
+from src.cache import ResponseCacheMixin, hit_response, miss_response
+from src.instrumentation import phase
+from src.listing import FastListMixin
+from src.pagination import KeysetPagination
+from src.views import InvoiceAPISet, RequestsAPISet
+
+LIST_ACTIONS = {"get": "list", "post": "create"}
+DETAIL_ACTIONS = {"get": "retrieve", "put": "update", "delete": "destroy"}
+
+
+async def run_sync(func, *args):
+    """
+    Call ``func`` in the thread of the sync views, where DRF hooks
+    (authenticators, permissions, filter backends, serializers) may query
+    the database or the cache without blocking the event loop.
+    """
+    return await sync_to_async(func)(*args)
+
+
+async def authenticate(request):
+    """Run the view's authenticators, natively async where they support it"""
+    for authenticator in request.authenticators:
+        if hasattr(authenticator, "aauthenticate"):
+            user_auth_tuple = await authenticator.aauthenticate(request)
+        else:
+            user_auth_tuple = await run_sync(authenticator.authenticate, request)
+        if user_auth_tuple is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth_tuple
+            return
+    request._not_authenticated()
+
+
+async def paginate_queryset(paginator, queryset, request):
+    """DRF ``paginate_queryset`` with the count and the rows fetched async"""
+    if isinstance(paginator, KeysetPagination):
+        page_queryset = paginator.get_page_queryset(queryset, request)
+        if paginator.wants_count(request):
+            paginator.count = await queryset.acount()
+        return paginator.build_page([row async for row in page_queryset])
+
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        paginator.page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(
+            paginator.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+        )
+    paginator.page.object_list = [row async for row in paginator.page.object_list]
+    if django_paginator.num_pages > 1 and paginator.template is not None:
+        paginator.display_page_controls = True
+    paginator.request = request
+    return paginator.page.object_list
+
+
+class AsyncReadView(View):
+    """
+    Serve ``list`` or ``retrieve`` of a DRF viewset with the async ORM.
+    Authentication, permissions, filter backends, pagination and serializers
+    are the viewset's own, so responses match the sync views. Other methods
+    are handed to the sync viewset.
+    """
+
+    viewset_class = None
+    action = None
+    http_method_names = ["get", "post", "put", "delete", "head", "options"]
+
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        viewset_class = initkwargs.get("viewset_class", cls.viewset_class)
+        actions = LIST_ACTIONS if initkwargs["action"] == "list" else DETAIL_ACTIONS
+        initkwargs["sync_view"] = viewset_class.as_view(actions)
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        view = self.viewset_class()
+        view.action_map = {"get": self.action}
+        view.args, view.kwargs = args, kwargs
+        view.request = request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        try:
+            view.format_kwarg = view.get_format_suffix(**kwargs)
+            neg = view.perform_content_negotiation(request)
+            request.accepted_renderer, request.accepted_media_type = neg
+            with phase("auth"):
+                await authenticate(request)
+                await run_sync(view.check_permissions, request)
+            response = await self.cached(view)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        response = view.finalize_response(request, response, *args, **kwargs)
+        return self.render(response)
+
+    async def cached(self, view):
+        """The response from the viewset's response cache, or a fresh one"""
+        if (
+            not isinstance(view, ResponseCacheMixin)
+            or not settings.RESPONSE_CACHE_ENABLED
+        ):
+            return await self.respond(view)
+        key = await view.aget_response_cache_key()
+        cached = await cache.aget(key)
+        if cached is not None:
+            return hit_response(cached)
+
+        response = await self.respond(view)
+        if response.status_code == status.HTTP_200_OK:
+            timeout = await run_sync(view.get_response_cache_timeout)
+            await cache.aset(key, response.data, timeout)
+        return miss_response(response)
+
+    async def respond(self, view):
+        if self.action == "list":
+            return await self.list(view)
+        queryset = await run_sync(view.filter_queryset, view.get_queryset())
+        return await self.retrieve(view, queryset)
+
+    async def list(self, view):
+        compiled = None
+        if isinstance(view, FastListMixin):
+            compiled = view.get_fast_list_fields()
+        if compiled is not None:
+            queryset = await run_sync(view.get_list_queryset, compiled.columns)
+        else:
+            queryset = await run_sync(view.filter_queryset, view.get_queryset())
+
+        page = None
+        if view.paginator is not None:
+            page = await paginate_queryset(view.paginator, queryset, view.request)
+        rows = page if page is not None else [row async for row in queryset]
+        if compiled is not None:
+            with phase("serialize"):
+                data = compiled.render(rows)
+        else:
+            data = await self.serialize(view, rows, many=True)
+        if page is None:
+            return Response(data)
+        return view.get_paginated_response(data)
+
+    async def retrieve(self, view, queryset):
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        filter_kwargs = {view.lookup_field: view.kwargs[lookup_url_kwarg]}
+        try:
+            instance = await queryset.aget(**filter_kwargs)
+        except (
+            queryset.model.DoesNotExist,
+            TypeError,
+            ValueError,
+            DjangoValidationError,
+        ):
+            if isinstance(view, ArchiveReadMixin) and view.includes_archived():
+                return Response(await run_sync(view.get_archived_row))
+            raise Http404
+        await run_sync(view.check_object_permissions, view.request, instance)
+        return Response(await self.serialize(view, instance))
+
+    @staticmethod
+    async def serialize(view, instance, many=False):
+        return await run_sync(lambda: view.get_serializer(instance, many=many).data)
+
+    @staticmethod
+    def render(response):
+        """Render on the event loop, Django renders template responses in a thread"""
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    put = delete = post
+
+
+class AsyncRequestsView(AsyncReadView):
+    viewset_class = RequestsAPISet
+
+
+class AsyncInvoiceView(AsyncReadView):
+    viewset_class = InvoiceAPISet
@@ -0,0 +1,162 @@
+"""JWT authentication that trusts role and status claims instead of loading the user"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from src.models import User
+
+VERSION_CLAIM = "ver"
+USER_CLAIMS = ("role", "is_staff", "is_active", VERSION_CLAIM)
+
+
+def token_version_key(user_id):
+    return f"auth:token-version:{user_id}"
+
+
+def user_claims(user):
+    """Claims embedded in the tokens issued for ``user``"""
+    return {
+        "role": user.role,
+        "is_staff": user.is_staff,
+        "is_active": user.is_active,
+        VERSION_CLAIM: user.token_version,
+    }
+
+
+def remember_token_version(user_id, version):
+    cache.set(token_version_key(user_id), version, settings.JWT_CLAIMS_VERSION_TTL)
+
+
+def forget_token_version(user_id):
+    cache.delete(token_version_key(user_id))
+
+
+def get_token_version(user_id):
+    """Current claims version of a user, from cache and from the database on a miss"""
+    version = cache.get(token_version_key(user_id))
+    if version is None:
+        version = (
+            User.objects.filter(pk=user_id)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        if version is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        remember_token_version(user_id, version)
+    return version
+
+
+async def aget_token_version(user_id):
+    """``get_token_version`` for async views"""
+    version = await cache.aget(token_version_key(user_id))
+    if version is None:
+        version = await (
+            User.objects.filter(pk=user_id)
+            .values_list("token_version", flat=True)
+            .afirst()
+        )
+        if version is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        await cache.aset(
+            token_version_key(user_id), version, settings.JWT_CLAIMS_VERSION_TTL
+        )
+    return version
+
+
+class ClaimsUser:
+    """
+    Authenticated user backed by token claims.
+    ``id``, ``role``, ``is_staff`` and ``is_active`` come from the token; any other
+    attribute loads the ``User`` row once and is read from it.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = token[api_settings.USER_ID_CLAIM]
+        self.role = token["role"]
+        self.is_staff = token["is_staff"]
+        self.is_active = token["is_active"]
+
+    def __str__(self):
+        return f"{self.role} := {self.id}"
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.pk)
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.user, attr)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticate with the claims of the access token, without a query per request.
+    The ``ver`` claim is compared against the user's ``token_version``, which is
+    bumped whenever role, staff or active flags change, so stale tokens are
+    rejected as soon as the cached version expires (``JWT_CLAIMS_VERSION_TTL``),
+    or immediately with a shared cache. Tokens issued without claims fall back
+    to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if not self.has_claims(validated_token):
+            return super().get_user(validated_token)
+        user_id = self.check_claims(validated_token)
+        if validated_token[VERSION_CLAIM] != get_token_version(user_id):
+            raise AuthenticationFailed(
+                _("Token claims are out of date"), code="token_outdated"
+            )
+        return ClaimsUser(validated_token)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if not self.has_claims(validated_token):
+            return await sync_to_async(super().get_user)(validated_token)
+        user_id = self.check_claims(validated_token)
+        if validated_token[VERSION_CLAIM] != await aget_token_version(user_id):
+            raise AuthenticationFailed(
+                _("Token claims are out of date"), code="token_outdated"
+            )
+        return ClaimsUser(validated_token)
+
+    @staticmethod
+    def has_claims(validated_token):
+        return all(claim in validated_token for claim in USER_CLAIMS)
+
+    @staticmethod
+    def check_claims(validated_token):
+        """User id of a token carrying claims, rejecting tokens of inactive users"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if not validated_token["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user_id
@@ -0,0 +1,491 @@
+"""Dataset, scenarios and runners behind ``manage.py benchmark``"""
+import base64
+import http.client
+import itertools
+import json
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.testcases import QuietWSGIRequestHandler
+
+from src.models import Invoice, Request, User
+from src.serializers import MyTokenLoginSerializer
+from src.signals import send_rows_written
+
+PASSWORD = "benchmark-password"
+
+
+class QueryCounter:
+    """Count queries on every connection of every thread"""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def start(self):
+        connection_created.connect(self.install)
+        for connection in connections.all():
+            self.install(connection)
+
+
+class Dataset:
+    """
+    ``customers`` customers with ``requests`` requests spread over them, half
+    of them done, and ``invoices`` unpaid invoices on the done ones, plus one
+    master. Rows go through ``send_rows_written`` so billing summaries and
+    the change log match, as after API writes.
+    """
+
+    def __init__(self, customers, requests, invoices):
+        self.sizes = {
+            "customers": customers,
+            "requests": requests,
+            "invoices": invoices,
+        }
+        encoded = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(phone_number=f"+38{number:010d}", password=encoded, is_active=True)
+            for number in range(max(customers, 1))
+        )
+        self.customer = users[0]
+        self.master = User.objects.create_user(
+            phone_number="+389999999999",
+            password=PASSWORD,
+            role=User.Roles.MASTER,
+            is_staff=True,
+        )
+        rows = Request.objects.bulk_create(
+            Request(
+                customer=users[number % len(users)],
+                phone_model=f"model {number % 20}",
+                problem_description=f"screen number {number} does not turn on",
+                status=Request.Statuses.DONE
+                if number % 2
+                else Request.Statuses.PROCESS,
+            )
+            for number in range(requests)
+        )
+        send_rows_written(Request, rows, created=True, enqueue_jobs=False)
+        done = [row for row in rows if row.status == Request.Statuses.DONE] or [
+            self.request(Request.Statuses.DONE)
+        ]
+        invoice_rows = Invoice.objects.bulk_create(
+            Invoice(request=done[number % len(done)], price=10 + number % 90)
+            for number in range(invoices)
+        )
+        send_rows_written(Invoice, invoice_rows, created=True, enqueue_jobs=False)
+
+        self.phones = itertools.count(5_000_000_000)
+        self.tokens = {
+            "customer": self.access_token(self.customer),
+            "master": self.access_token(self.master),
+        }
+        self.own_requests = list(
+            Request.objects.filter(customer=self.customer).values_list("pk", flat=True)
+        ) or [self.request().pk]
+        self.done_request = done[0].pk
+        self.invoice_ids = [invoice.pk for invoice in invoice_rows] or [
+            self.invoice().pk
+        ]
+
+    @staticmethod
+    def access_token(user):
+        return str(MyTokenLoginSerializer.get_token(user).access_token)
+
+    def request(self, status=Request.Statuses.PROCESS):
+        return Request.objects.create(
+            customer=self.customer,
+            phone_model="bench",
+            problem_description="created for a benchmark step",
+            status=status,
+        )
+
+    def invoice(self):
+        return Invoice.objects.create(request_id=self.done_request, price=10)
+
+    def refresh_token(self):
+        return str(MyTokenLoginSerializer.get_token(self.customer))
+
+
+class Scenario:
+    """
+    One route hit ``iterations`` times. ``path`` and ``body`` are strings or
+    callables of (dataset, iteration, prepared) where ``prepared`` is what
+    ``prepare(dataset)`` returned for that iteration before timing started.
+    ``items`` is the number of rows one request writes, for rows per second.
+    """
+
+    def __init__(
+        self, name, method, path, user="customer", body=None, prepare=None, items=1
+    ):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.body = body
+        self.prepare = prepare
+        self.items = items
+
+    def requests(self, dataset, iterations):
+        prepared = [
+            self.prepare(dataset) if self.prepare else None for _ in range(iterations)
+        ]
+        for iteration, item in enumerate(prepared):
+            path = self.path
+            if callable(path):
+                path = path(dataset, iteration, item)
+            body = self.body
+            if callable(body):
+                body = body(dataset, iteration, item)
+            token = dataset.tokens.get(self.user)
+            yield self.method, path, body, token
+
+
+def _own(dataset, iteration):
+    return dataset.own_requests[iteration % len(dataset.own_requests)]
+
+
+def _invoice(dataset, iteration):
+    return dataset.invoice_ids[iteration % len(dataset.invoice_ids)]
+
+
+def _deepest_page(dataset):
+    """Page number and keyset cursor of the last page of the customer's requests"""
+    size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    oldest = sorted(dataset.own_requests)[: size + 1]
+    pages = -(-len(dataset.own_requests) // size)
+    cursor = base64.urlsafe_b64encode(json.dumps({"k": oldest[-1]}).encode("ascii"))
+    return pages, cursor.decode("ascii")
+
+
+def _request_item(iteration):
+    return {"phone_model": f"model {iteration % 20}", "problem_description": "noise"}
+
+
+SCENARIOS = [
+    Scenario(
+        "registration",
+        "POST",
+        "/service/registration/",
+        user=None,
+        body=lambda d, i, p: {
+            "phone_number": f"+38{next(d.phones)}",
+            "password": PASSWORD,
+        },
+    ),
+    Scenario(
+        "login",
+        "POST",
+        "/service/login/",
+        user=None,
+        body=lambda d, i, p: {
+            "phone_number": d.customer.phone_number,
+            "password": PASSWORD,
+        },
+    ),
+    Scenario(
+        "logout",
+        "POST",
+        "/service/logout/",
+        body=lambda d, i, refresh: {"refresh": refresh},
+        prepare=lambda d: d.refresh_token(),
+    ),
+    Scenario("cabinet list polled", "GET", "/service/cabinet/"),
+    Scenario("cabinet list", "GET", lambda d, i, p: f"/service/cabinet/?nocache={i}"),
+    Scenario(
+        "cabinet keyset",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?pagination=keyset&nocache={i}",
+    ),
+    Scenario(
+        "cabinet last page",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?page={p[0]}&nocache={i}",
+        prepare=_deepest_page,
+    ),
+    Scenario(
+        "cabinet keyset last page",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?cursor={p[1]}&nocache={i}",
+        prepare=_deepest_page,
+    ),
+    Scenario(
+        "cabinet search",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?search=screen&nocache={i}",
+    ),
+    Scenario(
+        "cabinet filter",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?status=DONE&phone_model=model+1&nocache={i}",
+    ),
+    Scenario(
+        "cabinet list master",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?nocache={i}",
+        user="master",
+    ),
+    Scenario(
+        "cabinet facets",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/facets/?search=screen&nocache={i}",
+    ),
+    Scenario(
+        "cabinet list archived",
+        "GET",
+        lambda d, i, p: f"/service/cabinet/?include_archived=true&nocache={i}",
+    ),
+    Scenario(
+        "cabinet retrieve", "GET", lambda d, i, p: f"/service/cabinet/{_own(d, i)}/"
+    ),
+    Scenario(
+        "cabinet create",
+        "POST",
+        "/service/cabinet/",
+        body=lambda d, i, p: _request_item(i),
+    ),
+    Scenario(
+        "cabinet update",
+        "PUT",
+        lambda d, i, pk: f"/service/cabinet/{pk}/",
+        body=lambda d, i, p: _request_item(i),
+        prepare=lambda d: d.request().pk,
+    ),
+    Scenario(
+        "cabinet delete",
+        "DELETE",
+        lambda d, i, pk: f"/service/cabinet/{pk}/",
+        prepare=lambda d: d.request(Request.Statuses.DONE).pk,
+    ),
+    Scenario(
+        "cabinet bulk create",
+        "POST",
+        "/service/cabinet/bulk/",
+        body=lambda d, i, p: [_request_item(n) for n in range(20)],
+        items=20,
+    ),
+    Scenario(
+        "cabinet bulk update",
+        "PUT",
+        "/service/cabinet/bulk/",
+        body=lambda d, i, ids: [{"id": pk, **_request_item(i)} for pk in ids],
+        prepare=lambda d: [d.request().pk for _ in range(20)],
+        items=20,
+    ),
+    Scenario("cabinet export", "GET", "/service/cabinet/export/csv/"),
+    Scenario(
+        "async cabinet list",
+        "GET",
+        lambda d, i, p: f"/service/async/cabinet/?nocache={i}",
+    ),
+    Scenario(
+        "async cabinet retrieve",
+        "GET",
+        lambda d, i, p: f"/service/async/cabinet/{_own(d, i)}/",
+    ),
+    Scenario(
+        "billing list",
+        "GET",
+        lambda d, i, p: f"/service/billing/?nocache={i}",
+        user="master",
+    ),
+    Scenario(
+        "billing retrieve",
+        "GET",
+        lambda d, i, p: f"/service/billing/{_invoice(d, i)}/",
+        user="master",
+    ),
+    Scenario(
+        "billing create",
+        "POST",
+        "/service/billing/",
+        user="master",
+        body=lambda d, i, p: {"request": d.done_request, "price": 12.5},
+    ),
+    Scenario(
+        "billing update",
+        "PUT",
+        lambda d, i, pk: f"/service/billing/{pk}/",
+        user="master",
+        body=lambda d, i, p: {"request": d.done_request, "price": 15 + i},
+        prepare=lambda d: d.invoice().pk,
+    ),
+    Scenario(
+        "billing delete",
+        "DELETE",
+        lambda d, i, pk: f"/service/billing/{pk}/",
+        user="master",
+        prepare=lambda d: d.invoice().pk,
+    ),
+    Scenario(
+        "billing bulk create",
+        "POST",
+        "/service/billing/bulk/",
+        user="master",
+        body=lambda d, i, p: [
+            {"request": d.done_request, "price": n} for n in range(20)
+        ],
+        items=20,
+    ),
+    Scenario("billing summary", "GET", "/service/billing/summary/"),
+    Scenario("billing export", "GET", "/service/billing/export/jsonl/", user="master"),
+    Scenario(
+        "async billing list",
+        "GET",
+        lambda d, i, p: f"/service/async/billing/?nocache={i}",
+        user="master",
+    ),
+    Scenario("sync", "GET", "/service/sync/?limit=100"),
+    Scenario("cache stats", "GET", "/service/cache-stats/", user="master"),
+    Scenario("api root", "GET", "/service/"),
+    Scenario("swagger ui", "GET", "/", user=None),
+    Scenario("openapi schema", "GET", "/?format=openapi", user=None),
+    Scenario("admin login page", "GET", "/admin/login/", user=None),
+]
+
+
+class InProcessRunner:
+    """Requests through Django's test client, without sockets"""
+
+    name = "in-process"
+
+    def __init__(self):
+        self.client = Client()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send(self, method, path, body, token):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        data = json.dumps(body) if body is not None else None
+        response = self.client.generic(
+            method, path, data or "", content_type="application/json", **headers
+        )
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response.status_code
+
+
+class ServerRunner:
+    """Requests over HTTP to a threaded WSGI server on a local port"""
+
+    name = "server"
+
+    def __enter__(self):
+        # An in-memory test database only exists on this thread's connection
+        shared = {}
+        for connection in connections.all():
+            if connection.vendor == "sqlite" and connection.is_in_memory_db():
+                connection.inc_thread_sharing()
+                shared[connection.alias] = connection
+        self.server = ThreadedWSGIServer(
+            ("127.0.0.1", 0),
+            QuietWSGIRequestHandler,
+            allow_reuse_address=False,
+            connections_override=shared,
+        )
+        self.server.set_app(get_wsgi_application())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+    def send(self, method, path, body, token):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            payload = json.dumps(body).encode() if body is not None else None
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+
+def run_scenario(runner, scenario, dataset, iterations, counter):
+    """Time every request of ``scenario`` and summarise it"""
+    latencies, errors, queries = [], 0, 0
+    began = time.perf_counter()
+    for method, path, body, token in scenario.requests(dataset, iterations):
+        before = counter.count
+        started = time.perf_counter()
+        status = runner.send(method, path, body, token)
+        latencies.append(time.perf_counter() - started)
+        queries += counter.count - before
+        if status >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - began
+    return summarise(latencies, elapsed, queries, errors, scenario.items)
+
+
+def summarise(latencies, elapsed, queries, errors, items=1):
+    latencies = sorted(latencies)
+    cuts = (
+        statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    )
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "rows": len(latencies) * items / elapsed if elapsed else 0.0,
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+        "queries": queries / len(latencies),
+        "errors": errors,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against a saved baseline, as readable lines"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current["queries"] > previous["queries"] + 0.01:
+            regressions.append(
+                f"{key}: {current['queries']:.1f} queries per request, "
+                f"baseline {previous['queries']:.1f}"
+            )
+        if current["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: p95 {current['p95']:.1f} ms, baseline {previous['p95']:.1f} ms"
+            )
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {current['throughput']:.0f} req/s, "
+                f"baseline {previous['throughput']:.0f} req/s"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(
+                f"{key}: {current['errors']} errors, baseline {previous['errors']}"
+            )
+    return regressions
@@ -0,0 +1,162 @@
+"""Per-customer invoice totals kept up to date on every invoice write"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from src.models import ArchivedInvoice, BillingSummary, Invoice, Request
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0, 0.0])
+
+
+def record_invoice_writes(invoices, deleted=False):
+    """Apply the count/total changes of saved, bulk written or deleted invoices"""
+    deltas = _new_deltas()
+    customers = {}
+    for invoice in invoices:
+        current = {
+            "request_id": invoice.request_id,
+            "status": invoice.status,
+            "price": invoice.price,
+        }
+        loaded = getattr(invoice, "_loaded_values", None)
+        before = {**current, **loaded} if loaded is not None else None
+        if deleted:
+            before = before or current
+        if before is not None:
+            deltas[before["request_id"], before["status"]][0] -= 1
+            deltas[before["request_id"], before["status"]][1] -= before["price"]
+        if not deleted:
+            deltas[invoice.request_id, invoice.status][0] += 1
+            deltas[invoice.request_id, invoice.status][1] += invoice.price
+        if Invoice.request.is_cached(invoice):
+            customers[invoice.request_id] = invoice.request.customer_id
+
+    missing = {request_id for request_id, _ in deltas} - customers.keys()
+    if missing:
+        customers.update(
+            Request.objects.filter(pk__in=missing).values_list("pk", "customer_id")
+        )
+
+    by_customer = _new_deltas()
+    for (request_id, status), (count, total) in deltas.items():
+        by_customer[customers[request_id], status][0] += count
+        by_customer[customers[request_id], status][1] += total
+    apply_deltas(by_customer)
+
+
+def record_request_writes(requests):
+    """Move the totals of requests that were reassigned to another customer"""
+    moved = {}
+    for request in requests:
+        loaded = getattr(request, "_loaded_values", None) or {}
+        previous = loaded.get("customer_id", request.customer_id)
+        if previous != request.customer_id:
+            moved[request.pk] = (previous, request.customer_id)
+    if not moved:
+        return
+
+    deltas = _new_deltas()
+    rows = [
+        *Invoice.objects.filter(request_id__in=moved)
+        .values("request_id", "status")
+        .annotate(invoice_count=Count("id"), total=Sum("price"))
+        .order_by(),
+        *ArchivedInvoice.objects.filter(request_id__in=moved)
+        .values("request_id", "status")
+        .annotate(invoice_count=Count("id"), total=Sum("price"))
+        .order_by(),
+    ]
+    for request_id, (previous, current) in moved.items():
+        ArchivedInvoice.objects.filter(request_id=request_id).update(
+            customer_id=current
+        )
+    for row in rows:
+        previous, current = moved[row["request_id"]]
+        deltas[previous, row["status"]][0] -= row["invoice_count"]
+        deltas[previous, row["status"]][1] -= row["total"]
+        deltas[current, row["status"]][0] += row["invoice_count"]
+        deltas[current, row["status"]][1] += row["total"]
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    """Add (customer_id, status) -> [count, total] changes to the summary table"""
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if not deltas:
+        return
+    with transaction.atomic():
+        BillingSummary.objects.bulk_create(
+            [
+                BillingSummary(customer_id=customer_id, status=status)
+                for customer_id, status in deltas
+            ],
+            ignore_conflicts=True,
+        )
+        # Sorted so concurrent writers lock summary rows in the same order
+        for (customer_id, status), (count, total) in sorted(deltas.items()):
+            BillingSummary.objects.filter(
+                customer_id=customer_id, status=status
+            ).update(invoice_count=F("invoice_count") + count, total=F("total") + total)
+
+
+def aggregate_invoices():
+    """
+    Raw (customer_id, status) -> (count, total) computed from the invoice
+    table and its archive
+    """
+    rows = [
+        *Invoice.objects.values("status", customer_id=F("request__customer_id"))
+        .annotate(invoice_count=Count("id"), total=Sum("price"))
+        .order_by(),
+        *ArchivedInvoice.objects.values("customer_id", "status")
+        .annotate(invoice_count=Count("id"), total=Sum("price"))
+        .order_by(),
+    ]
+    aggregate = defaultdict(lambda: (0, 0.0))
+    for row in rows:
+        count, total = aggregate[row["customer_id"], row["status"]]
+        aggregate[row["customer_id"], row["status"]] = (
+            count + row["invoice_count"],
+            total + row["total"],
+        )
+    return dict(aggregate)
+
+
+def stored_summary():
+    rows = BillingSummary.objects.values_list(
+        "customer_id", "status", "invoice_count", "total"
+    )
+    return {
+        (customer_id, status): (count, total)
+        for customer_id, status, count, total in rows
+        if count or total
+    }
+
+
+def find_mismatches():
+    """Keys where the summary table disagrees with the raw aggregate"""
+    expected, stored = aggregate_invoices(), stored_summary()
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(key, (0, 0.0)), stored.get(key, (0, 0.0))
+        if want[0] != have[0] or not math.isclose(
+            want[1], have[1], rel_tol=1e-9, abs_tol=1e-6
+        ):
+            mismatches.append((key, want, have))
+    return mismatches
+
+
+@transaction.atomic
+def rebuild():
+    """Replace the summary table with the raw aggregate"""
+    BillingSummary.objects.all().delete()
+    BillingSummary.objects.bulk_create(
+        BillingSummary(
+            customer_id=customer_id, status=status, invoice_count=count, total=total
+        )
+        for (customer_id, status), (count, total) in aggregate_invoices().items()
+    )
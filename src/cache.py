@@ -0,0 +1,160 @@
+"""Cached list and retrieve responses, invalidated by generation counters"""
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from src.routers import read_from_replica
+
+ALL = "all"
+
+# Hits and misses of this process, see ``CacheStatsView``
+stats = Counter()
+
+
+def generation_key(label, scope):
+    return f"respcache:gen:{label}:{scope}"
+
+
+def _initial_generation():
+    # Starting from the clock rather than 0 means a counter that was evicted
+    # never comes back with a value already used in cached response keys.
+    return time.time_ns()
+
+
+def get_generation(label, scope):
+    key = generation_key(label, scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(label, scope):
+    key = generation_key(label, scope)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _initial_generation(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def written_key(label):
+    return f"respcache:written:{label}"
+
+
+def bump_generations(label, scopes):
+    for scope in scopes:
+        key = generation_key(label, scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    if settings.REPLICA_DATABASES:
+        cache.set(written_key(label), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def invalidate(model, customer_ids=()):
+    """
+    Drop cached responses over ``model`` rows: those of every staff/master
+    listing and those scoped to ``customer_ids``. Deferred to the commit of
+    the current transaction, so a response is never cached under the new
+    generation with rows the transaction has not committed yet.
+    """
+    scopes = {ALL, *customer_ids}
+    label = model._meta.label_lower
+    transaction.on_commit(lambda: bump_generations(label, scopes))
+
+
+def response_key(request, label, scope, generation):
+    user = request.user
+    parts = (
+        label,
+        str(scope),
+        str(generation),
+        str(user.pk),
+        str(user.role),
+        str(user.is_staff),
+        request.accepted_renderer.format,
+        request.build_absolute_uri(),
+    )
+    digest = hashlib.sha1("\0".join(parts).encode()).hexdigest()
+    return f"respcache:{digest}"
+
+
+def hit_response(data):
+    stats["hit"] += 1
+    response = Response(data)
+    response["X-Cache"] = "HIT"
+    return response
+
+
+def miss_response(response):
+    stats["miss"] += 1
+    response["X-Cache"] = "MISS"
+    return response
+
+
+class ResponseCacheMixin:
+    """
+    Serve ``list`` and ``retrieve`` from the cache. Entries are keyed on the
+    user, role, renderer and full path with query string, plus a generation
+    counter that writes to the model bump (see ``invalidate``): one per
+    customer for views that only show the caller's rows, one shared otherwise.
+    Responses carry ``X-Cache: HIT`` or ``MISS``. Off unless
+    ``RESPONSE_CACHE_ENABLED``, as writers outside a shared cache never
+    invalidate it.
+    """
+
+    response_cache_timeout = None
+
+    def get_response_cache_scope(self):
+        """Customer id whose rows the caller sees, or ``ALL``"""
+        return ALL
+
+    def get_response_cache_key(self):
+        label = self.get_queryset().model._meta.label_lower
+        scope = self.get_response_cache_scope()
+        generation = get_generation(label, scope)
+        return response_key(self.request, label, scope, generation)
+
+    async def aget_response_cache_key(self):
+        label = self.get_queryset().model._meta.label_lower
+        scope = self.get_response_cache_scope()
+        generation = await aget_generation(label, scope)
+        return response_key(self.request, label, scope, generation)
+
+    def get_response_cache_timeout(self):
+        timeout = self.response_cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+        if read_from_replica():
+            # A replica may not have the latest write yet; don't keep its rows
+            # under the new generation for longer than it may lag behind.
+            label = self.get_queryset().model._meta.label_lower
+            if cache.get(written_key(label)) is not None:
+                return min(timeout, settings.REPLICA_STICKY_SECONDS)
+        return timeout
+
+    def cached_response(self, handler, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return handler(*args, **kwargs)
+        key = self.get_response_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            return hit_response(cached)
+
+        response = handler(*args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.get_response_cache_timeout())
+        return miss_response(response)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,159 @@
+"""Change log of requests and invoices that clients sync from"""
+import base64
+import binascii
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from src.models import Change, Request, User
+
+
+def record_changes(model, instances, deleted=False):
+    """
+    Replace the change rows of ``instances`` with new ones at the end of the
+    sequence. A request that moved to another customer also gets a tombstone
+    for the previous customer, so that customer's clients drop it.
+    """
+    kind = Change.Kinds.REQUEST if model is Request else Change.Kinds.INVOICE
+    changes = []
+    for instance in instances:
+        if model is Request:
+            loaded = getattr(instance, "_loaded_values", None) or {}
+            previous = loaded.get("customer_id", instance.customer_id)
+            if previous != instance.customer_id:
+                changes.append(
+                    Change(
+                        kind=kind,
+                        object_id=instance.pk,
+                        customer_id=previous,
+                        deleted=True,
+                    )
+                )
+            customer_id = instance.customer_id
+        else:
+            customer_id = None
+        changes.append(
+            Change(
+                kind=kind,
+                object_id=instance.pk,
+                customer_id=customer_id,
+                deleted=deleted,
+            )
+        )
+    if not changes:
+        return
+
+    by_customer = defaultdict(set)
+    for change in changes:
+        by_customer[change.customer_id].add(change.object_id)
+    superseded = Q()
+    for customer_id, object_ids in by_customer.items():
+        superseded |= Q(customer_id=customer_id, object_id__in=object_ids)
+    Change.objects.filter(superseded, kind=kind).delete()
+    Change.objects.bulk_create(changes)
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Sync token expired, fetch everything again without ?since=."
+    default_code = "sync_token_expired"
+
+
+# Oldest transaction id that may still commit: changes of older transactions
+# are all visible. The reading transaction itself does not hold readers back.
+VISIBLE_HORIZON = """
+SELECT CASE WHEN txid_current_if_assigned() = xmin THEN xmin + 1 ELSE xmin END
+FROM txid_snapshot_xmin(txid_current_snapshot()) AS xmin
+"""
+
+
+def encode_token(position):
+    transaction_id, change_id = position
+    token = {"x": transaction_id, "c": change_id, "t": int(time.time())}
+    return base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+
+def decode_token(token):
+    """(transaction id, change id) a sync token continues from, (0, 0) for no token"""
+    if not token:
+        return 0, 0
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        change_id, issued = int(position["c"]), int(position["t"])
+        # Tokens issued before transaction ids were tracked
+        transaction_id = int(position.get("x", 0))
+    except (
+        TypeError,
+        ValueError,
+        KeyError,
+        AttributeError,
+        binascii.Error,
+        UnicodeEncodeError,
+    ):
+        raise ValidationError({"since": "Invalid sync token."})
+    # Tombstones older than this are pruned, the client may have missed some
+    if issued < time.time() - settings.SYNC_TOMBSTONE_DAYS * 86400:
+        raise SyncTokenExpired()
+    return transaction_id, change_id
+
+
+def visible_changes(user):
+    """Changes ``user`` may sync, scoped like the cabinet and billing endpoints"""
+    requests = Q(kind=Change.Kinds.REQUEST)
+    if user.role != User.Roles.MASTER:
+        requests &= Q(customer_id=user.id)
+    if user.is_staff:
+        requests |= Q(kind=Change.Kinds.INVOICE)
+    return Change.objects.filter(requests)
+
+
+def read_changes(queryset, since, limit):
+    """
+    Up to ``limit`` changes after the ``since`` position, reduced to the latest
+    per object. Returns ids to upsert and ids to delete by kind, the last
+    position read and whether more changes follow.
+
+    Changes are read in commit-safe order: by the id of the writing
+    transaction, and only from transactions older than every one still
+    running. A transaction committing late would otherwise add a change id
+    below the position a client already synced past.
+    """
+    since_transaction, since_id = since
+    queryset = queryset.filter(
+        Q(transaction_id__gt=since_transaction)
+        | Q(transaction_id=since_transaction, id__gt=since_id)
+    )
+    if connections[queryset.db].vendor == "postgresql":
+        queryset = queryset.filter(transaction_id__lt=RawSQL(VISIBLE_HORIZON, ()))
+    rows = list(
+        queryset.order_by("transaction_id", "id").values_list(
+            "transaction_id", "id", "kind", "object_id", "deleted"
+        )[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, _, kind, object_id, deleted in rows:
+        latest[kind, object_id] = deleted
+    upserts, deletes = defaultdict(list), defaultdict(list)
+    for (kind, object_id), deleted in latest.items():
+        (deletes if deleted else upserts)[kind].append(object_id)
+    position = tuple(rows[-1][:2]) if rows else since
+    return upserts, deletes, position, has_more
+
+
+def prune_tombstones():
+    """Delete tombstones older than ``SYNC_TOMBSTONE_DAYS``"""
+    horizon = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    deleted, _ = Change.objects.filter(deleted=True, created_at__lt=horizon).delete()
+    return deleted
@@ -0,0 +1,125 @@
+"""Optimistic concurrency: writes guarded by the row version instead of row locks"""
+from django.db import transaction
+from django.db.models import F
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from src.signals import send_rows_written
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The row changed since the version given in If-Match."
+    default_code = "precondition_failed"
+
+
+class VersionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The row was changed by another request, reload it and retry."
+    default_code = "version_conflict"
+
+
+def version_etag(version):
+    return quote_etag(str(version))
+
+
+def check_if_match(request, instance):
+    """
+    Raise ``PreconditionFailed`` when the request has an ``If-Match`` header
+    that does not name the current version of ``instance``
+    """
+    etags = parse_etags(request.headers.get("If-Match", ""))
+    if etags and "*" not in etags and version_etag(instance.version) not in etags:
+        raise PreconditionFailed()
+
+
+def compare_and_swap(instance, fields, conflict=VersionConflict):
+    """
+    Write ``fields`` of ``instance`` and bump its version with one
+    ``UPDATE ... WHERE id = %s AND version = %s``. When another write changed
+    the row since ``instance`` was loaded nothing is written and ``conflict``
+    is raised.
+    """
+    model = type(instance)
+    values = {}
+    for name in fields:
+        attname = model._meta.get_field(name).attname
+        values[attname] = getattr(instance, attname)
+    updated = model._base_manager.filter(pk=instance.pk, version=instance.version)
+    if not updated.update(**values, version=F("version") + 1):
+        raise conflict()
+    instance.version += 1
+
+
+class OptimisticConcurrencyMixin:
+    """
+    Updates and deletes of a ``VersionedModel`` viewset that only apply to the
+    row version they were decided on. ``If-Match: "<version>"`` makes the
+    client's version the condition (412 when it is stale); without it the
+    version read by the request is, and a concurrent write answers 409.
+    Detail responses carry the version as ``ETag``; bulk update items may
+    carry a ``version`` that is checked the same way.
+    """
+
+    def get_object(self):
+        instance = super().get_object()
+        if self.request.method not in ("GET", "HEAD", "OPTIONS"):
+            check_if_match(self.request, instance)
+        return instance
+
+    def get_conflict_class(self):
+        if "If-Match" in self.request.headers:
+            return PreconditionFailed
+        return VersionConflict
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        for attr, value in serializer.validated_data.items():
+            setattr(instance, attr, value)
+        # The receivers' writes, jobs among them, commit with the row
+        with transaction.atomic():
+            compare_and_swap(
+                instance, serializer.validated_data.keys(), self.get_conflict_class()
+            )
+            send_rows_written(type(instance), [instance], created=False)
+        instance.reset_loaded_values()
+
+    def perform_destroy(self, instance):
+        model = type(instance)
+        with transaction.atomic():
+            current = (
+                model._base_manager.select_for_update()
+                .filter(pk=instance.pk, version=instance.version)
+                .first()
+            )
+            if current is None:
+                raise self.get_conflict_class()()
+            current.delete()
+
+    def check_bulk_update(self, instance, item):
+        version = item.get("version")
+        if version is not None and version != instance.version:
+            return f"Changed since version {version}, now at {instance.version}."
+        return super().check_bulk_update(instance, item)
+
+    def get_bulk_update_fields(self):
+        return [*super().get_bulk_update_fields(), "version"]
+
+    def perform_bulk_update(self, instances):
+        # The rows are locked by bulk_update, so the versions cannot move
+        for instance in instances:
+            instance.version += 1
+        super().perform_bulk_update(instances)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        data = getattr(response, "data", None)
+        if (
+            self.action in ("retrieve", "update")
+            and response.status_code == status.HTTP_200_OK
+            and isinstance(data, dict)
+            and "version" in data
+        ):
+            response["ETag"] = version_etag(data["version"])
+        return response
@@ -1,5 +1,6 @@
 """Module contain requests to database"""
-from src.models import Request, User, Invoice
+from django.db import transaction
+from src.models import BillingSummary, Request, User, Invoice
 from rest_framework import serializers
 
 
@@ -27,9 +28,13 @@ def get_query_by_username(username):
         raise serializers.ValidationError("This user not found")
 
 
-def req_status_by_id(request_id):
-    """Method to extract status of request by id field"""
-    return Request.objects.get(id=request_id).status
+def get_requests_by_ids(request_ids):
+    """Return requests by id. Inside a transaction the rows are locked in id order,
+    so concurrent writers queue up instead of deadlocking"""
+    queryset = Request.objects.filter(pk__in=request_ids).order_by("pk")
+    if transaction.get_connection(queryset.db).in_atomic_block:
+        queryset = queryset.select_for_update()
+    return {request.pk: request for request in queryset}
 
 
 def get_username_by_phone_number(phone_number):
@@ -43,3 +48,18 @@ def get_username_by_phone_number(phone_number):
 def get_customer_billings_by_id(customer_id_: int):
     """Return all invoices for customer by its id"""
     return Invoice.objects.filter(request__customer_id=customer_id_)
+
+
+def get_customer_billing_summary(customer_id_: int):
+    """Return invoice count and total per status for customer by its id"""
+    statuses = {
+        status: {"count": 0, "total": 0.0} for status in Invoice.Statuses.values
+    }
+    for row in BillingSummary.objects.filter(customer_id=customer_id_):
+        statuses[row.status] = {"count": row.invoice_count, "total": row.total}
+    return {
+        "customer": customer_id_,
+        "count": sum(status["count"] for status in statuses.values()),
+        "total": sum(status["total"] for status in statuses.values()),
+        "statuses": statuses,
+    }
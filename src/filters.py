@@ -0,0 +1,51 @@
+"""Filter backends for the service endpoints"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import SearchFilter
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ``?search=`` over the GIN indexed ``search_vector`` column on PostgreSQL,
+    best matches first. Other databases (SQLite in tests) and models without
+    the column (the archive tables) fall back to the ``icontains`` lookups of
+    ``SearchFilter`` over the view's ``search_fields``.
+    """
+
+    search_vector_field = "search_vector"
+    search_config = "english"
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, "").strip()
+        if (
+            not terms
+            or connections[queryset.db].vendor != "postgresql"
+            or not hasattr(queryset.model, self.search_vector_field)
+        ):
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(terms, config=self.search_config, search_type="websearch")
+        return (
+            queryset.filter(**{self.search_vector_field: query})
+            .annotate(search_rank=SearchRank(F(self.search_vector_field), query))
+            .order_by("-search_rank", "-pk")
+        )
+
+
+class FacetFilterBackend(DjangoFilterBackend):
+    """
+    ``DjangoFilterBackend`` that leaves out the view's ``ignored_filter_fields``,
+    so ``FacetsMixin`` can count a facet without its own filter
+    """
+
+    def get_filterset_kwargs(self, request, queryset, view):
+        kwargs = super().get_filterset_kwargs(request, queryset, view)
+        ignored = getattr(view, "ignored_filter_fields", ())
+        if ignored:
+            data = kwargs["data"].copy()
+            for field in ignored:
+                data.pop(field, None)
+            kwargs["data"] = data
+        return kwargs
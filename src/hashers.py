@@ -0,0 +1,112 @@
+"""Password hashing on a bounded worker pool"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the work factor from ``PASSWORD_PBKDF2_ITERATIONS``. It keeps
+    the ``pbkdf2_sha256`` algorithm name, so existing hashes still verify and
+    are rehashed with the tuned iterations on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins in progress, try again shortly."
+    default_code = "hashing_pool_saturated"
+
+
+class HashingPool:
+    """
+    Run password hashing on at most ``HASHING_POOL_SIZE`` threads, with up to
+    ``HASHING_QUEUE_LIMIT`` more calls waiting. Beyond that a call fails at
+    once with ``HashingPoolSaturated`` instead of queueing behind the storm.
+    ``hashlib.pbkdf2_hmac`` releases the GIL, so the threads hash in parallel
+    while request threads only wait. The pool is per process, so calls only
+    wait or get rejected under workers serving several requests at once
+    (gthread, ASGI). ``in_flight`` counts the calls hashing or waiting.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.in_flight = 0
+
+    def start(self):
+        size = settings.HASHING_POOL_SIZE
+        self.executor = ThreadPoolExecutor(size, thread_name_prefix="hashing")
+        self.capacity = size + settings.HASHING_QUEUE_LIMIT
+        self.in_flight = 0
+        # Worker threads do not survive a fork, e.g. gunicorn --preload
+        self.pid = os.getpid()
+
+    def run(self, func, *args):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.start()
+            if self.in_flight >= self.capacity:
+                raise HashingPoolSaturated()
+            self.in_flight += 1
+        try:
+            future = self.executor.submit(self.call, func, *args)
+        except BaseException:
+            self.finished()
+            raise
+        return future.result()
+
+    def call(self, func, *args):
+        # Counted down before the caller gets the result
+        try:
+            return func(*args)
+        finally:
+            self.finished()
+
+    def finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+pool = HashingPool()
+
+
+def make_password(password):
+    """``django.contrib.auth.hashers.make_password`` on the hashing pool"""
+    return pool.run(hashers.make_password, password)
+
+
+def check_password(password, encoded, setter=None, preferred="default"):
+    """
+    ``django.contrib.auth.hashers.check_password`` with the hash verified on
+    the hashing pool. ``setter`` is called on the caller's thread, as it saves
+    the rehashed password.
+    """
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+
+    preferred = hashers.get_hasher(preferred)
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = pool.run(hasher.verify, password, encoded)
+
+    if not is_correct and not hasher_changed and must_update:
+        pool.run(hasher.harden_runtime, password, encoded)
+
+    if setter and is_correct and must_update:
+        setter(password)
+    return is_correct
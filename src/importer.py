@@ -0,0 +1,267 @@
+"""Batch loader for JSONL dumps of users, requests and invoices
+
+Every line is one JSON object with a ``type`` of ``user``, ``request`` or
+``invoice``, an explicit ``id`` and the model fields, foreign keys by id::
+
+    {"type": "user", "id": 7, "phone_number": "+380991112233", "password": "..."}
+    {"type": "request", "id": 12, "customer": 7, "phone_model": "x", "problem_description": "..."}
+    {"type": "invoice", "id": 30, "request": 12, "price": 10.5, "status": "PAID"}
+
+Rows referenced by later rows must appear earlier in the file.
+"""
+import io
+import json
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from src.models import Invoice, Request, User
+from src.serializers import check_phone_number, check_request_done
+from src.signals import send_rows_written
+
+IMPORT_FIELDS = {
+    User: {
+        "id",
+        "phone_number",
+        "password",
+        "role",
+        "is_staff",
+        "is_active",
+        "is_superuser",
+        "date_joined",
+        "last_login",
+    },
+    Request: {"id", "status", "phone_model", "problem_description", "customer"},
+    Invoice: {"id", "price", "status", "request"},
+}
+MODELS_BY_TYPE = {"user": User, "request": Request, "invoice": Invoice}
+FOREIGN_KEYS = {Request: "customer", Invoice: "request"}
+
+
+class RowError(Exception):
+    pass
+
+
+def _error_text(error):
+    if isinstance(error, DjangoValidationError):
+        if not hasattr(error, "error_dict"):
+            return " ".join(error.messages)
+        return "; ".join(
+            f"{field}: {' '.join(messages)}"
+            for field, messages in error.message_dict.items()
+        )
+    if isinstance(error, ValidationError):
+        return " ".join(str(detail) for detail in error.detail)
+    return str(error)
+
+
+def _copy_value(value):
+    """Encode one value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class Importer:
+    """
+    Validate one batch of parsed lines and write the accepted rows. Rows of
+    earlier batches are committed, so references to them are looked up in
+    the database and nothing is kept between batches.
+    """
+
+    def __init__(self, use_copy=None, strict=False):
+        if use_copy is None:
+            use_copy = connection.vendor == "postgresql"
+        self.use_copy = use_copy
+        self.strict = strict
+
+    def load_batch(self, lines):
+        """
+        ``lines`` is a list of (line number, raw text). Returns the number of
+        rows written and a list of (line number, error) for rejected rows.
+        In strict mode nothing is written when any row is rejected.
+        """
+        rows = {User: [], Request: [], Invoice: []}
+        errors = []
+        for number, text in lines:
+            try:
+                data = json.loads(text)
+                model = MODELS_BY_TYPE[data.pop("type")]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                errors.append((number, "not a JSON object with a known type"))
+                continue
+            rows[model].append((number, data))
+
+        accepted = {}
+        pending = {User: set(), Request: {}}
+        for model in (User, Request, Invoice):
+            accepted[model] = self.validate(model, rows[model], errors, pending)
+            if model is User:
+                pending[User].update(user.pk for user in accepted[User])
+            elif model is Request:
+                pending[Request].update(
+                    (request.pk, request.status) for request in accepted[Request]
+                )
+        errors.sort()
+        if errors and self.strict:
+            return 0, errors
+
+        with transaction.atomic():
+            for model in (User, Request, Invoice):
+                self.write(model, accepted[model])
+            # Imported history is not news, no invoices or notices are due
+            send_rows_written(
+                Request, accepted[Request], created=True, enqueue_jobs=False
+            )
+            send_rows_written(
+                Invoice, accepted[Invoice], created=True, enqueue_jobs=False
+            )
+            # A run stopped after this batch leaves the sequences usable
+            self.reset_sequences()
+        return sum(len(instances) for instances in accepted.values()), errors
+
+    def validate(self, model, rows, errors, pending):
+        instances = []
+        for number, data in rows:
+            try:
+                instances.append((number, self.build(model, data)))
+            except (RowError, DjangoValidationError, ValidationError) as error:
+                errors.append((number, _error_text(error)))
+
+        existing = set(
+            model.objects.filter(
+                pk__in=[instance.pk for _, instance in instances]
+            ).values_list("pk", flat=True)
+        )
+        if model is User:
+            existing_phones = set(
+                User.objects.filter(
+                    phone_number__in=[user.phone_number for _, user in instances]
+                ).values_list("phone_number", flat=True)
+            )
+        parents = self.parents(model, [instance for _, instance in instances], pending)
+
+        accepted, seen = [], set()
+        for number, instance in instances:
+            try:
+                if instance.pk in existing or instance.pk in seen:
+                    raise RowError(f"{model.__name__} {instance.pk} already exists")
+                if model is User:
+                    if instance.phone_number in existing_phones:
+                        raise RowError(f"{instance.phone_number} is already registered")
+                    existing_phones.add(instance.phone_number)
+                elif model is Request and instance.customer_id not in parents:
+                    raise RowError(f"customer {instance.customer_id} not found")
+                elif model is Invoice:
+                    if instance.request_id not in parents:
+                        raise RowError(f"request {instance.request_id} not found")
+                    check_request_done(parents[instance.request_id])
+            except (RowError, ValidationError) as error:
+                errors.append((number, _error_text(error)))
+                continue
+            seen.add(instance.pk)
+            accepted.append(instance)
+        return accepted
+
+    def build(self, model, data):
+        unknown = data.keys() - IMPORT_FIELDS[model]
+        if unknown:
+            raise RowError(f"unknown fields {', '.join(sorted(unknown))}")
+        if "id" not in data:
+            raise RowError("id is required")
+
+        foreign_key = FOREIGN_KEYS.get(model)
+        if foreign_key is not None:
+            if foreign_key not in data:
+                raise RowError(f"{foreign_key} is required")
+            data[f"{foreign_key}_id"] = data.pop(foreign_key)
+
+        if model is User:
+            check_phone_number(str(data.get("phone_number", "")))
+            data.setdefault("is_active", True)
+            data["password"] = self.password_hash(data.get("password"))
+
+        instance = model(**data)
+        instance.clean_fields(exclude=["customer", "request", "search_vector"])
+        if foreign_key is not None:
+            field = model._meta.get_field(foreign_key)
+            value = field.target_field.to_python(data[field.attname])
+            setattr(instance, field.attname, value)
+        return instance
+
+    @staticmethod
+    def password_hash(password):
+        """Keep hashes exported from the old system, hash plain passwords"""
+        if not password:
+            raise RowError("password is required")
+        try:
+            identify_hasher(password)
+            return password
+        except ValueError:
+            return make_password(password)
+
+    def parents(self, model, instances, pending):
+        """
+        Ids (and statuses) of the rows that ``instances`` point at, looked up in
+        one query for whatever is not in this batch
+        """
+        if model is Request:
+            ids = {instance.customer_id for instance in instances} - pending[User]
+            found = User.objects.filter(pk__in=ids).values_list("pk", flat=True)
+            return pending[User] | set(found)
+        if model is Invoice:
+            ids = {instance.request_id for instance in instances}
+            ids -= pending[Request].keys()
+            found = Request.objects.filter(pk__in=ids).values_list("pk", "status")
+            return {**dict(found), **pending[Request]}
+        return None
+
+    def write(self, model, instances):
+        if not instances:
+            return
+        if self.use_copy:
+            self.copy(model, instances)
+        else:
+            model.objects.bulk_create(instances, batch_size=1000)
+
+    @staticmethod
+    def copy(model, instances):
+        """Load rows with PostgreSQL ``COPY ... FROM STDIN``"""
+        fields = model._meta.concrete_fields
+        buffer = io.StringIO()
+        for instance in instances:
+            values = (
+                field.get_db_prep_save(field.pre_save(instance, True), connection)
+                for field in fields
+            )
+            buffer.write("\t".join(_copy_value(value) for value in values))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN", buffer
+            )
+
+    @staticmethod
+    def reset_sequences():
+        """Move id sequences past the explicitly imported ids"""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Request, Invoice]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
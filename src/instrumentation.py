@@ -0,0 +1,278 @@
+"""Per-request query and phase timings, Server-Timing and Prometheus metrics"""
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from src.jobs import expose_metrics as expose_job_metrics
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar("instrumentation_timings", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+PHASES = ("auth", "filter", "serialize", "render")
+
+
+class Timings:
+    """What one request spent, filled in by the query wrapper and ``phase``"""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.view = "unmatched"
+        self.queries = 0
+        self.db = 0.0
+        self.statements = Counter()
+        self.phases = defaultdict(float)
+        self.active = set()
+
+    def server_timing(self, total):
+        entries = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"']
+        for name in PHASES:
+            if name in self.phases:
+                entries.append(f"{name};dur={self.phases[name] * 1000:.1f}")
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def time_query(execute, sql, params, many, context):
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += perf_counter() - started
+        timings.queries += 1
+        timings.statements[sql] += 1
+
+
+def install_query_timer(connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to phase ``name`` of the current request"""
+    timings = current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.phases[name] += perf_counter() - started
+
+
+def timed(name, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with phase(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class InstrumentedViewMixin:
+    """Time authentication and permissions, and rendering, of a DRF view"""
+
+    def initial(self, request, *args, **kwargs):
+        with phase("auth"):
+            super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = current.get()
+        if timings is not None and not getattr(response, "is_rendered", True):
+            started = perf_counter()
+
+            def rendered(response):
+                timings.phases["render"] += perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class InstrumentedGenericViewMixin(InstrumentedViewMixin):
+    """
+    Also time the filter backends and serializer validation and representation
+    of a ``GenericAPIView``.
+    """
+
+    def filter_queryset(self, queryset):
+        with phase("filter"):
+            return super().filter_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.is_valid = timed("serialize", serializer.is_valid)
+        serializer.to_representation = timed("serialize", serializer.to_representation)
+        return serializer
+
+
+request_duration = Histogram(
+    "service_request_duration_seconds",
+    "Time to produce the response, by view action.",
+    ("view", "method", "status"),
+    buckets=DURATION_BUCKETS,
+)
+request_db_duration = Histogram(
+    "service_request_db_duration_seconds",
+    "Time spent in database queries per request, by view action.",
+    ("view",),
+    buckets=DURATION_BUCKETS,
+)
+request_queries = Histogram(
+    "service_request_queries",
+    "Database queries per request, by view action.",
+    ("view",),
+    buckets=QUERY_BUCKETS,
+)
+request_phase_duration = Histogram(
+    "service_request_phase_duration_seconds",
+    "Time spent in auth, filter, serialize and render, by view action.",
+    ("view", "phase"),
+    buckets=DURATION_BUCKETS,
+)
+
+
+def metrics_registry():
+    """
+    The registry of this process or, when ``PROMETHEUS_MULTIPROC_DIR`` is set
+    (gunicorn.conf.py does), one summing the files written by every worker
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def view_label(request, view_func):
+    """``RequestsAPISet.list``-style name of the view handling ``request``"""
+    method = request.method.lower()
+    cls = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if cls is None:
+        return f"{view_func.__module__}.{view_func.__qualname__}"
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return f"{cls.__name__}.{actions.get(method, method)}"
+    initkwargs = getattr(view_func, "view_initkwargs", None) or {}
+    return f"{cls.__name__}.{initkwargs.get('action', method)}"
+
+
+class InstrumentationMiddleware:
+    """
+    Count the queries and database time of every request, add them with the
+    view phase timings to a ``Server-Timing`` header and the ``/metrics``
+    histograms, and log views whose query count passes
+    ``N_PLUS_ONE_QUERY_THRESHOLD``. Place it first to time the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        # Connections opened before this module was imported
+        for connection in connections.all():
+            install_query_timer(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings = Timings()
+        token = current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = Timings()
+        token = current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current.get()
+        if timings is not None:
+            timings.view = view_label(request, view_func)
+
+    def finish(self, request, response, timings):
+        total = perf_counter() - timings.started
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timings.server_timing(total)
+
+        view = timings.view
+        request_duration.labels(view, request.method, response.status_code).observe(
+            total
+        )
+        request_db_duration.labels(view).observe(timings.db)
+        request_queries.labels(view).observe(timings.queries)
+        for name, seconds in timings.phases.items():
+            request_phase_duration.labels(view, name).observe(seconds)
+
+        if timings.queries > settings.N_PLUS_ONE_QUERY_THRESHOLD:
+            statement, repeats = timings.statements.most_common(1)[0]
+            logger.warning(
+                "%s ran %d queries for %s %s; repeated %d times: %s",
+                view,
+                timings.queries,
+                request.method,
+                request.path,
+                repeats,
+                statement,
+            )
+        return response
+
+
+def metrics(request):
+    """
+    The request histograms of every worker and the background job queue
+    gauges in the Prometheus text format. ``METRICS_TOKEN`` must be sent as a
+    bearer token; when it is empty the metrics are only served in DEBUG.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401)
+    body = generate_latest(metrics_registry()).decode()
+    body += "\n".join(expose_job_metrics()) + "\n"
+    return HttpResponse(body, content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,277 @@
+"""Background jobs kept in the database and run by the run_jobs worker"""
+import logging
+import random
+import statistics
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from src.models import Job, Request
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+METRICS_CACHE_KEY = "jobs:metrics"
+
+
+def handler(task):
+    """
+    Register the function running jobs of ``task``, called with the payload
+    as keyword arguments inside a transaction. A job runs at least once: it is
+    retried when it raises and when its worker dies, so handlers have to be
+    idempotent.
+    """
+
+    def register(func):
+        HANDLERS[task] = func
+        return func
+
+    return register
+
+
+def enqueue(task, payloads, delay=0):
+    """
+    Write a job of ``task`` per payload. Inside a transaction the jobs only
+    exist once it commits, together with the change they are about.
+    """
+    run_at = timezone.now() + timedelta(seconds=delay)
+    return Job.objects.bulk_create(
+        Job(
+            task=task,
+            payload=payload,
+            run_at=run_at,
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+        )
+        for payload in payloads
+    )
+
+
+def record_request_writes(requests):
+    """
+    Enqueue the follow-up work of updated requests whose status moved from
+    the one they were loaded with to DONE, see src.tasks. Rows without a
+    loaded status, like created or imported ones, enqueue nothing. The
+    invoice is only issued when the write gave its ``invoice_price``.
+    """
+    notices, invoices = [], []
+    for request in requests:
+        loaded = getattr(request, "_loaded_values", None) or {}
+        if request.status != Request.Statuses.DONE or loaded.get("status") in (
+            None,
+            Request.Statuses.DONE,
+        ):
+            continue
+        notices.append({"request": request.pk})
+        price = getattr(request, "invoice_price", None)
+        if price is not None:
+            invoices.append({"request": request.pk, "price": price})
+    if invoices:
+        enqueue("create_invoice", invoices)
+    if notices:
+        enqueue("notify_customer", notices)
+
+
+def due_jobs(now):
+    """Pending jobs whose time came and running ones whose worker let go"""
+    return Q(status=Job.Statuses.PENDING, run_at__lte=now) | Q(
+        status=Job.Statuses.RUNNING, locked_until__lt=now
+    )
+
+
+def claim(limit):
+    """Mark up to ``limit`` due jobs as running for this worker and return them"""
+    now = timezone.now()
+    due = due_jobs(now)
+    queryset = Job.objects.filter(due).order_by("run_at")
+    changes = {
+        "status": Job.Statuses.RUNNING,
+        "attempts": F("attempts") + 1,
+        "locked_until": now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+        "started_at": now,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        # Concurrent workers skip the rows locked here instead of waiting
+        with transaction.atomic():
+            ids = list(
+                queryset.select_for_update(skip_locked=True).values_list(
+                    "pk", flat=True
+                )[:limit]
+            )
+            Job.objects.filter(pk__in=ids).update(**changes)
+    else:
+        # Without row locks a job belongs to the worker whose update still
+        # finds it due
+        ids = [
+            pk
+            for pk in queryset.values_list("pk", flat=True)[:limit]
+            if Job.objects.filter(due, pk=pk).update(**changes)
+        ]
+    if not ids:
+        return []
+    return list(Job.objects.filter(pk__in=ids).order_by("run_at"))
+
+
+def backoff(attempts):
+    """Seconds before retrying a job that failed ``attempts`` times"""
+    delay = min(
+        settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_BACKOFF_MAX,
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def run(job):
+    """Run a claimed job and record how it went"""
+    func = HANDLERS.get(job.task)
+    began = time.perf_counter()
+    try:
+        if func is None:
+            raise LookupError(f"No handler for task {job.task!r}")
+        with transaction.atomic():
+            func(**job.payload)
+    except Exception as exc:
+        error = "".join(traceback.format_exception(exc))
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s %s failed for good:\n%s", job.pk, job.task, error)
+            changes = {"status": Job.Statuses.FAILED, "finished_at": now}
+        else:
+            logger.warning("Job %s %s failed, retrying:\n%s", job.pk, job.task, error)
+            run_at = now + timedelta(seconds=backoff(job.attempts))
+            changes = {"status": Job.Statuses.PENDING, "run_at": run_at}
+        changes["last_error"] = error
+    else:
+        logger.info(
+            "Job %s %s done in %.3fs", job.pk, job.task, time.perf_counter() - began
+        )
+        changes = {"status": Job.Statuses.DONE, "finished_at": timezone.now()}
+    finished = Job.objects.filter(
+        pk=job.pk, status=Job.Statuses.RUNNING, attempts=job.attempts
+    ).update(locked_until=None, **changes)
+    if not finished:
+        logger.warning("Job %s %s outlived its lease", job.pk, job.task)
+
+
+def prune_jobs():
+    """Delete jobs done more than ``JOBS_RETENTION_DAYS`` ago"""
+    cutoff = timezone.now() - timedelta(days=settings.JOBS_RETENTION_DAYS)
+    deleted, _ = Job.objects.filter(
+        status=Job.Statuses.DONE, finished_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+class Worker:
+    """Claims due jobs while it has free threads and runs them on a pool"""
+
+    def __init__(self, concurrency):
+        if connection.vendor == "sqlite" and concurrency > 1:
+            # A SQLite transaction that reads before it writes fails instead
+            # of waiting when another one writes, jobs would mostly retry
+            logger.warning("SQLite runs one job at a time")
+            concurrency = 1
+        self.concurrency = concurrency
+        self.stopping = threading.Event()
+        self.pruned = None
+
+    def stop(self):
+        """Claim nothing more, the jobs already running are finished"""
+        self.stopping.set()
+
+    def run(self, once=False):
+        """Work until stopped, or with ``once`` until no job is due"""
+        running = set()
+        with ThreadPoolExecutor(self.concurrency, "job") as pool:
+            while not self.stopping.is_set():
+                running = {future for future in running if not future.done()}
+                free = self.concurrency - len(running)
+                jobs = claim(free) if free else []
+                for job in jobs:
+                    running.add(pool.submit(self.run_job, job))
+                if jobs and len(jobs) == free:
+                    continue
+                if running:
+                    wait(running, settings.JOBS_POLL_SECONDS, FIRST_COMPLETED)
+                elif once:
+                    break
+                else:
+                    self.idle()
+                    self.stopping.wait(settings.JOBS_POLL_SECONDS)
+            close_old_connections()
+
+    @staticmethod
+    def run_job(job):
+        close_old_connections()
+        try:
+            run(job)
+        finally:
+            close_old_connections()
+
+    def idle(self):
+        if self.pruned is None or time.monotonic() - self.pruned > 3600:
+            self.pruned = time.monotonic()
+            deleted = prune_jobs()
+            if deleted:
+                logger.info("Deleted %s finished jobs", deleted)
+
+
+def expose_metrics():
+    """
+    Queue depth per task and status, the age of the oldest due job, and the
+    wait and run time quantiles of jobs finished in the last
+    ``JOBS_METRICS_WINDOW`` seconds, as Prometheus gauges. They are cached for
+    ``JOBS_METRICS_CACHE_SECONDS``, so scrapes of many workers query once.
+    """
+    lines = cache.get(METRICS_CACHE_KEY)
+    if lines is None:
+        lines = queue_metrics()
+        cache.set(METRICS_CACHE_KEY, lines, settings.JOBS_METRICS_CACHE_SECONDS)
+    return lines
+
+
+def queue_metrics():
+    now = timezone.now()
+    lines = [
+        "# HELP service_jobs Background jobs per task and status",
+        "# TYPE service_jobs gauge",
+    ]
+    depth = Job.objects.values_list("task", "status").annotate(Count("id"))
+    for task, status, count in sorted(depth):
+        lines.append(f'service_jobs{{task="{task}",status="{status}"}} {count}')
+
+    oldest = Job.objects.filter(status=Job.Statuses.PENDING, run_at__lte=now).aggregate(
+        oldest=Min("run_at")
+    )["oldest"]
+    lag = (now - oldest).total_seconds() if oldest else 0
+    lines += [
+        "# HELP service_jobs_lag_seconds How long the oldest due job has waited",
+        "# TYPE service_jobs_lag_seconds gauge",
+        f"service_jobs_lag_seconds {lag}",
+    ]
+
+    finished = Job.objects.filter(
+        finished_at__gte=now - timedelta(seconds=settings.JOBS_METRICS_WINDOW)
+    ).values_list("run_at", "started_at", "finished_at")[:1000]
+    waits, runs = [], []
+    for run_at, started_at, finished_at in finished:
+        waits.append((started_at - run_at).total_seconds())
+        runs.append((finished_at - started_at).total_seconds())
+    for name, documentation, values in (
+        ("service_job_wait_seconds", "Time from due to started", waits),
+        ("service_job_run_seconds", "Time from started to finished", runs),
+    ):
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+        if len(values) > 1:
+            cuts = statistics.quantiles(values, n=100)
+            lines.append(f'{name}{{quantile="0.5"}} {cuts[49]}')
+            lines.append(f'{name}{{quantile="0.95"}} {cuts[94]}')
+    return lines
@@ -0,0 +1,124 @@
+"""Read-only list rendering from ``values()`` rows instead of serializer instances"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields, relations, serializers
+from rest_framework.response import Response
+
+from src.instrumentation import phase
+
+UNSUPPORTED_FIELDS = (
+    serializers.BaseSerializer,
+    relations.ManyRelatedField,
+    fields.SerializerMethodField,
+)
+
+
+class CompiledFields:
+    """
+    Output name, ``values()`` column and ``to_representation`` of every field
+    a serializer renders, taken from the serializer itself so the rendered
+    rows match its output exactly.
+    """
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.columns = tuple(column for _, column, _ in mapping)
+
+    def render(self, rows):
+        """Serializer output for a list of ``values(*columns)`` dicts"""
+        rendered = []
+        for row in rows:
+            item = {}
+            for name, column, convert in self.mapping:
+                value = row[column]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            rendered.append(item)
+        return rendered
+
+
+def _compile_field(field, model):
+    if isinstance(field, UNSUPPORTED_FIELDS) or "." in field.source:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete:
+        return None
+
+    if isinstance(field, relations.RelatedField):
+        # Only a plain primary key is rendered without loading the related row
+        if (
+            type(field).to_representation
+            is not relations.PrimaryKeyRelatedField.to_representation
+            or not field.use_pk_only_optimization()
+            or model_field.many_to_many
+        ):
+            return None
+        convert = field.pk_field.to_representation if field.pk_field else None
+        return field.field_name, model_field.attname, convert
+
+    if type(field).get_attribute is not fields.Field.get_attribute:
+        return None
+    if model_field.is_relation:
+        return None
+    return field.field_name, model_field.attname, field.to_representation
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """
+    ``CompiledFields`` of a ``ModelSerializer`` class, or None when one of its
+    fields or its ``to_representation`` needs model instances.
+    """
+    serializer = serializer_class(many=True)
+    if (
+        serializer_class.to_representation
+        is not serializers.Serializer.to_representation
+        or type(serializer).to_representation
+        is not serializers.ListSerializer.to_representation
+    ):
+        return None
+    child = serializer.child
+    model = child.Meta.model
+
+    mapping = []
+    for field in child._readable_fields:
+        compiled = _compile_field(field, model)
+        if compiled is None:
+            return None
+        mapping.append(compiled)
+    return CompiledFields(tuple(mapping))
+
+
+class FastListMixin:
+    """
+    ``list`` that fetches ``values()`` dicts and renders them through the
+    serializer's compiled field mapping, skipping model instances and the
+    per-field serializer machinery. The JSON is identical to the serializer's.
+    Serializers that need instances keep the regular ``list``.
+    """
+
+    def get_fast_list_fields(self):
+        return compile_serializer(self.get_serializer_class())
+
+    def get_list_queryset(self, columns):
+        """The filtered ``values(*columns)`` rows to list"""
+        return self.filter_queryset(self.get_queryset()).values(*columns)
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_fast_list_fields()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_list_queryset(compiled.columns)
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset if page is None else page)
+        with phase("serialize"):
+            data = compiled.render(rows)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,88 @@
+"""Move old paid invoices and done requests to the archive tables"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from src.archive import (
+    archivable_invoices,
+    archivable_requests,
+    archive_all,
+    table_sizes,
+)
+from src.models import ArchivedInvoice, ArchivedRequest, Invoice, Request
+
+MODELS = (Request, Invoice, ArchivedRequest, ArchivedInvoice)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move paid invoices, then done requests without hot invoices, that "
+        "were not written for --days into the archive tables, in batches of "
+        "one transaction each. Stopping it loses no work, the next run goes "
+        "on from the rows still left. Reports the rows moved and, on "
+        "PostgreSQL, table and index sizes before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count the rows to move"
+        )
+        parser.add_argument(
+            "--reindex",
+            action="store_true",
+            help="REINDEX the hot tables CONCURRENTLY afterwards, so their "
+            "indexes give the freed pages back (PostgreSQL)",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            cutoff = timezone.now() - timedelta(days=options["days"])
+            self.stdout.write(
+                f"{archivable_invoices(cutoff).count()} invoices and "
+                f"{archivable_requests(cutoff).count()} requests to archive "
+                "(requests whose invoices are archived now are counted next run)"
+            )
+            return
+
+        before = table_sizes(MODELS)
+        moved = {Request: 0, Invoice: 0}
+        for model, count in archive_all(options["days"], options["batch_size"]):
+            moved[model] += count
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Archived {count} {model._meta.verbose_name_plural}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {moved[Invoice]} invoices and {moved[Request]} requests "
+                f"untouched for {options['days']} days"
+            )
+        )
+
+        if before is None:
+            return
+        if options["reindex"]:
+            with connection.cursor() as cursor:
+                for model in (Request, Invoice):
+                    table = connection.ops.quote_name(model._meta.db_table)
+                    cursor.execute(f"REINDEX TABLE CONCURRENTLY {table}")
+        after = table_sizes(MODELS)
+        self.stdout.write(
+            f"{'table':<22} {'table MB':>10} {'indexes MB':>11} {'index change':>13}"
+        )
+        for table, (table_bytes, index_bytes) in after.items():
+            change = index_bytes - before[table][1]
+            self.stdout.write(
+                f"{table:<22} {table_bytes / 2**20:>10.2f} "
+                f"{index_bytes / 2**20:>11.2f} {change / 2**20:>+12.2f}M"
+            )
+        if not options["reindex"]:
+            self.stdout.write(
+                "Deleted index entries are reused after VACUUM, pass --reindex "
+                "to shrink the hot indexes now."
+            )
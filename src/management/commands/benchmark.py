@@ -0,0 +1,127 @@
+"""Drive every route against a seeded dataset and compare with a baseline"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from src.benchmark import (
+    SCENARIOS,
+    Dataset,
+    InProcessRunner,
+    QueryCounter,
+    ServerRunner,
+    compare,
+    run_scenario,
+)
+
+RUNNERS = {"in-process": (InProcessRunner,), "server": (ServerRunner,)}
+RUNNERS["both"] = RUNNERS["in-process"] + RUNNERS["server"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with N customers, M requests and K "
+        "invoices, then hit every route of lampatest/urls.py and src/urls.py "
+        "in-process and over a local HTTP server. Reports throughput, latency "
+        "percentiles, rows written per second (bulk against single writes) "
+        "and queries per request, saves them as a baseline and "
+        "fails when a run regresses against a saved one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--invoices", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--mode", choices=sorted(RUNNERS), default="both")
+        parser.add_argument(
+            "--only", default="", help="Comma separated scenario names to run"
+        )
+        parser.add_argument(
+            "--password-iterations",
+            type=int,
+            default=1000,
+            help="PBKDF2 iterations, so logins measure the app and not the hash",
+        )
+        parser.add_argument("--save", metavar="PATH", help="Write results as JSON")
+        parser.add_argument(
+            "--compare", metavar="PATH", help="Fail on regressions against a baseline"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed relative p95 and throughput change, 0.2 by default",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options["only"]:
+            names = set(options["only"].split(","))
+            scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+            if len(scenarios) != len(names):
+                raise CommandError("Unknown scenario in --only")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)
+
+        settings.PASSWORD_PBKDF2_ITERATIONS = options["password_iterations"]
+        counter = QueryCounter()
+        results = {}
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            dataset = Dataset(
+                options["customers"], options["requests"], options["invoices"]
+            )
+            counter.start()
+            self.stdout.write(
+                f"{'scenario':<35} {'req/s':>8} {'rows/s':>8} {'p50 ms':>8} "
+                f"{'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}"
+            )
+            for runner_class in RUNNERS[options["mode"]]:
+                with runner_class() as runner:
+                    for scenario in scenarios:
+                        result = run_scenario(
+                            runner, scenario, dataset, options["iterations"], counter
+                        )
+                        key = f"{runner.name}/{scenario.name}"
+                        results[key] = result
+                        self.report(key, result)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options["save"]:
+            with open(options["save"], "w") as file:
+                json.dump(
+                    {"dataset": dataset.sizes, "results": results}, file, indent=2
+                )
+            self.stdout.write(f"Saved {len(results)} results to {options['save']}")
+        if baseline is not None:
+            if baseline["dataset"] != dataset.sizes:
+                self.stderr.write(
+                    f"Baseline dataset {baseline['dataset']} differs from "
+                    f"{dataset.sizes}, numbers are not comparable"
+                )
+            regressions = compare(results, baseline["results"], options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressions against the baseline:\n" + "\n".join(regressions)
+                )
+            self.stdout.write("No regressions against the baseline")
+
+    def report(self, key, result):
+        line = (
+            f"{key:<35} {result['throughput']:>8.1f} {result['rows']:>8.1f} "
+            f"{result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f} "
+            f"{result['queries']:>8.1f} {result['errors']:>7}"
+        )
+        self.stdout.write(self.style.ERROR(line) if result["errors"] else line)
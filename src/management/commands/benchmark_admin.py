@@ -0,0 +1,161 @@
+"""Time the admin changelists and forms on a large seeded dataset"""
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from src.benchmark import QueryCounter, summarise
+from src.models import Invoice, Request, User
+
+BATCH_SIZE = 10000
+
+PAGES = [
+    ("users", "/admin/src/user/"),
+    ("users search", "/admin/src/user/?q=%2B38000000"),
+    ("requests", "/admin/src/request/"),
+    ("requests done", "/admin/src/request/?status__exact=DONE"),
+    ("requests page 100", "/admin/src/request/?p=100"),
+    ("requests by status", "/admin/src/request/?o=2"),
+    ("invoices", "/admin/src/invoice/"),
+    ("invoices paid", "/admin/src/invoice/?status__exact=PAID"),
+    ("request change", "/admin/src/request/{request}/change/"),
+    ("request add", "/admin/src/request/add/"),
+    ("invoice change", "/admin/src/invoice/{invoice}/change/"),
+    (
+        "customer autocomplete",
+        "/admin/autocomplete/?app_label=src&model_name=request"
+        "&field_name=customer&term=%2B3800",
+    ),
+]
+
+
+def batches(objects):
+    objects = iter(objects)
+    while batch := list(itertools.islice(objects, BATCH_SIZE)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with N customers, M requests and K "
+        "invoices, then load the admin changelists, filters, deep pages, "
+        "change forms and the customer autocomplete as a superuser. Reports "
+        "latency percentiles and queries per page, and fails when a page "
+        "errors or runs more than --max-queries queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10000)
+        parser.add_argument("--requests", type=int, default=200000)
+        parser.add_argument("--invoices", type=int, default=100000)
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument("--max-queries", type=int, default=8)
+
+    def handle(self, *args, **options):
+        counter = QueryCounter()
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            began = time.perf_counter()
+            ids = self.seed(
+                options["customers"], options["requests"], options["invoices"]
+            )
+            self.stdout.write(
+                f"Seeded {options['requests']} requests and {options['invoices']} "
+                f"invoices in {time.perf_counter() - began:.0f}s"
+            )
+            counter.start()
+            client = Client()
+            client.force_login(
+                User.objects.create_superuser(
+                    phone_number="+389999999999", password="benchmark-password"
+                )
+            )
+            failures = []
+            self.stdout.write(
+                f"{'page':<24} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'status':>7}"
+            )
+            for name, path in PAGES:
+                result, status = self.measure(
+                    client, path.format(**ids), options["iterations"], counter
+                )
+                self.stdout.write(
+                    f"{name:<24} {result['p50']:>8.2f} {result['p95']:>8.2f} "
+                    f"{result['queries']:>8.1f} {status:>7}"
+                )
+                if status != 200:
+                    failures.append(f"{name}: status {status}")
+                if result["queries"] > options["max_queries"]:
+                    failures.append(f"{name}: {result['queries']:.1f} queries")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        if failures:
+            raise CommandError("; ".join(failures))
+
+    @staticmethod
+    def seed(customers, requests, invoices):
+        """Bulk insert the rows, the admin reads them and needs no signals"""
+        for batch in batches(
+            User(phone_number=f"+38{number:010d}", password="!", is_active=True)
+            for number in range(max(customers, 1))
+        ):
+            User.objects.bulk_create(batch)
+        customer_ids = list(User.objects.values_list("pk", flat=True))
+        for batch in batches(
+            Request(
+                customer_id=customer_ids[number % len(customer_ids)],
+                phone_model=f"model {number % 20}",
+                problem_description=f"screen number {number} does not turn on",
+                status=Request.Statuses.DONE
+                if number % 2
+                else Request.Statuses.PROCESS,
+            )
+            for number in range(max(requests, 1))
+        ):
+            Request.objects.bulk_create(batch)
+        done = list(
+            Request.objects.filter(status=Request.Statuses.DONE).values_list(
+                "pk", flat=True
+            )
+        ) or [Request.objects.values_list("pk", flat=True).first()]
+        for batch in batches(
+            Invoice(
+                request_id=done[number % len(done)],
+                price=10 + number % 90,
+                status=Invoice.Statuses.PAID if number % 3 else Invoice.Statuses.UNPAID,
+            )
+            for number in range(max(invoices, 1))
+        ):
+            Invoice.objects.bulk_create(batch)
+        if connection.vendor == "postgresql":
+            # Planner estimates, and so the changelist counts, come from here
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        return {
+            "request": done[0],
+            "invoice": Invoice.objects.values_list("pk", flat=True).first(),
+        }
+
+    @staticmethod
+    def measure(client, path, iterations, counter):
+        status = client.get(path).status_code
+        latencies, queries = [], 0
+        began = time.perf_counter()
+        for _ in range(iterations):
+            before = counter.count
+            started = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - started)
+            queries += counter.count - before
+            status = max(status, response.status_code)
+        elapsed = time.perf_counter() - began
+        return summarise(latencies, elapsed, queries, 0), status
@@ -0,0 +1,144 @@
+"""Compare latency of the sync and async read endpoints under concurrent load"""
+import asyncio
+import statistics
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from src.models import Invoice, Request, User
+from src.serializers import MyTokenLoginSerializer
+
+SCENARIOS = (
+    ("cabinet list", "cabinet/", "customer"),
+    ("cabinet keyset", "cabinet/?pagination=keyset&page_size=20", "customer"),
+    ("billing list", "billing/", "staff"),
+)
+VARIANTS = (("sync", "/service/"), ("async", "/service/async/"))
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database, then drive the ASGI application "
+        "in-process with concurrent GETs against /service/ and /service/async/ "
+        "and report throughput and p50/p95/p99 latency for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--concurrency",
+            default="1,10,50",
+            help="Comma separated numbers of concurrent clients",
+        )
+        parser.add_argument("--rows", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options["concurrency"].split(",")]
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            tokens = self.seed(options["rows"])
+            application = get_asgi_application()
+            for name, path, role in SCENARIOS:
+                self.stdout.write(f"\n{name}")
+                self.stdout.write(
+                    f"{'view':<6} {'conc':>5} {'req/s':>8} {'p50 ms':>8} "
+                    f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>6}"
+                )
+                for concurrency in levels:
+                    for variant, prefix in VARIANTS:
+                        latencies, errors, elapsed = asyncio.run(
+                            self.load(
+                                application,
+                                prefix + path,
+                                tokens[role],
+                                options["requests"],
+                                concurrency,
+                            )
+                        )
+                        self.report(variant, concurrency, latencies, errors, elapsed)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    @staticmethod
+    def seed(rows):
+        customer = User.objects.create_user(phone_number="+380990000001", password="x")
+        staff = User.objects.create_user(
+            phone_number="+380990000002", password="x", is_staff=True
+        )
+        requests = Request.objects.bulk_create(
+            Request(
+                customer=customer,
+                phone_model=f"model {number % 20}",
+                problem_description=f"broken screen {number}",
+                status=Request.Statuses.DONE,
+            )
+            for number in range(rows)
+        )
+        Invoice.objects.bulk_create(
+            Invoice(request=request, price=10) for request in requests
+        )
+        return {
+            role: str(MyTokenLoginSerializer.get_token(user).access_token)
+            for role, user in (("customer", customer), ("staff", staff))
+        }
+
+    async def load(self, application, url, token, total, concurrency):
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Bearer {token}".encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+        latencies, errors = [], 0
+        remaining = iter(range(total))
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def client():
+            nonlocal errors
+            for _ in remaining:
+                status = []
+
+                async def send(message):
+                    if message["type"] == "http.response.start":
+                        status.append(message["status"])
+
+                began = time.perf_counter()
+                await application(dict(scope), receive, send)
+                latencies.append(time.perf_counter() - began)
+                if status != [200]:
+                    errors += 1
+
+        began = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - began
+
+    def report(self, variant, concurrency, latencies, errors, elapsed):
+        cuts = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{variant:<6} {concurrency:>5} {len(latencies) / elapsed:>8.0f} "
+            f"{cuts[49] * 1000:>8.1f} {cuts[94] * 1000:>8.1f} "
+            f"{cuts[98] * 1000:>8.1f} {errors:>6}"
+        )
@@ -0,0 +1,157 @@
+"""Race concurrent invoice updates with and without row versions"""
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from src.concurrency import VersionConflict, compare_and_swap
+from src.models import Invoice, Request, User
+
+STRATEGIES = ("blind", "pessimistic", "optimistic")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with invoices and let threads add 1 "
+        "to their price concurrently, each reading the row, thinking "
+        "and writing it back: blindly, under select_for_update, or with a "
+        "compare-and-swap on the version that retries on conflict. Reports "
+        "updates per second, retries and lost updates of each strategy. "
+        "With few rows per thread retries repeat the work and locking wins. "
+        "Run it against PostgreSQL, SQLite serializes every write."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--rows", type=int, default=200)
+        parser.add_argument("--updates", type=int, default=1000)
+        parser.add_argument(
+            "--think-ms",
+            type=float,
+            default=1.0,
+            help="Time between reading a row and writing it back",
+        )
+        parser.add_argument(
+            "--strategy", choices=STRATEGIES, action="append", dest="strategies"
+        )
+
+    def handle(self, *args, **options):
+        strategies = options["strategies"] or STRATEGIES
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            ids = self.seed(options["rows"])
+            self.stdout.write(
+                f"{options['threads']} threads, {options['rows']} rows, "
+                f"{options['updates']} updates, {options['think_ms']} ms think"
+            )
+            self.stdout.write(
+                f"{'strategy':<12} {'updates/s':>10} {'retries':>8} {'lost':>6}"
+            )
+            results = {}
+            for strategy in strategies:
+                Invoice.objects.filter(pk__in=ids).update(price=0, version=1)
+                elapsed, retries = self.run(
+                    getattr(self, strategy),
+                    ids,
+                    options["updates"],
+                    options["threads"],
+                    options["think_ms"] / 1000,
+                )
+                total = sum(
+                    Invoice.objects.filter(pk__in=ids).values_list("price", flat=True)
+                )
+                lost = options["updates"] - int(total)
+                results[strategy] = (options["updates"] / elapsed, lost)
+                line = (
+                    f"{strategy:<12} {options['updates'] / elapsed:>10.1f} "
+                    f"{retries:>8} {lost:>6}"
+                )
+                self.stdout.write(self.style.ERROR(line) if lost else line)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if results.get("optimistic", (0, 0))[1]:
+            raise CommandError("Optimistic updates lost writes")
+
+    @staticmethod
+    def seed(rows):
+        customer = User.objects.create(phone_number="+380990000000")
+        request = Request.objects.create(
+            customer=customer, phone_model="benchmark", problem_description="race"
+        )
+        invoices = Invoice.objects.bulk_create(
+            Invoice(request=request, price=0) for _ in range(rows)
+        )
+        return [invoice.pk for invoice in invoices]
+
+    @staticmethod
+    def blind(pk, think):
+        invoice = Invoice.objects.get(pk=pk)
+        time.sleep(think)
+        Invoice.objects.filter(pk=pk).update(
+            price=invoice.price + 1, version=F("version") + 1
+        )
+        return 0
+
+    @staticmethod
+    def pessimistic(pk, think):
+        with transaction.atomic():
+            invoice = Invoice.objects.select_for_update().get(pk=pk)
+            time.sleep(think)
+            Invoice.objects.filter(pk=pk).update(
+                price=invoice.price + 1, version=F("version") + 1
+            )
+        return 0
+
+    @staticmethod
+    def optimistic(pk, think):
+        retries = 0
+        while True:
+            invoice = Invoice.objects.get(pk=pk)
+            time.sleep(think)
+            invoice.price += 1
+            try:
+                compare_and_swap(invoice, ["price"])
+            except VersionConflict:
+                retries += 1
+                continue
+            return retries
+
+    @staticmethod
+    def run(update, ids, total, concurrency, think):
+        remaining = iter(range(total))
+        lock = threading.Lock()
+        retries = []
+        rng = random.Random(0)
+
+        def worker():
+            count = 0
+            while True:
+                with lock:
+                    number = next(remaining, None)
+                    pk = rng.choice(ids)
+                if number is None:
+                    break
+                count += update(pk, think)
+            with lock:
+                retries.append(count)
+            connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - began, sum(retries)
@@ -0,0 +1,87 @@
+"""Compare serializer and compiled ``values()`` rendering of list pages"""
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from rest_framework.renderers import JSONRenderer
+
+from src.listing import compile_serializer
+from src.models import Invoice, Request, User
+from src.serializers import InvoiceSerializer, RequestsSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and time fetching plus rendering one "
+        "list page to JSON through the serializer and through the compiled "
+        "values() path, for each page size. src.tests checks that both give "
+        "the same JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,100,1000")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.seed(max(sizes))
+            self.stdout.write(
+                f"{'serializer':<19} {'rows':>5} {'serializer ms':>14} "
+                f"{'values ms':>10} {'speedup':>8}"
+            )
+            for serializer_class, model in (
+                (RequestsSerializer, Request),
+                (InvoiceSerializer, Invoice),
+            ):
+                for size in sizes:
+                    self.compare(serializer_class, model, size, options["repeat"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    @staticmethod
+    def seed(rows):
+        customer = User.objects.create_user(phone_number="+380990000001", password="x")
+        requests = Request.objects.bulk_create(
+            Request(
+                customer=customer,
+                phone_model=f"model {number % 20}",
+                problem_description=f"Screen «{number}» does not turn on",
+                status=Request.Statuses.DONE,
+            )
+            for number in range(rows)
+        )
+        Invoice.objects.bulk_create(
+            Invoice(request=request, price=number * 1.5)
+            for number, request in enumerate(requests)
+        )
+
+    def compare(self, serializer_class, model, size, repeat):
+        renderer = JSONRenderer()
+        compiled = compile_serializer(serializer_class)
+        if compiled is None:
+            raise CommandError(f"{serializer_class.__name__} cannot be compiled")
+        queryset = model.objects.order_by("-id")
+
+        def through_serializer():
+            rows = list(queryset[:size])
+            return renderer.render(serializer_class(rows, many=True).data)
+
+        def through_values():
+            rows = list(queryset.values(*compiled.columns)[:size])
+            return renderer.render(compiled.render(rows))
+
+        slow = min(timeit.repeat(through_serializer, number=1, repeat=repeat))
+        fast = min(timeit.repeat(through_values, number=1, repeat=repeat))
+        self.stdout.write(
+            f"{serializer_class.__name__:<19} {size:>5} {slow * 1000:>14.2f} "
+            f"{fast * 1000:>10.2f} {slow / fast:>7.1f}x"
+        )
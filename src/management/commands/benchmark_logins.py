@@ -0,0 +1,121 @@
+"""Measure login throughput with passwords verified on the hashing pool"""
+import json
+import os
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from src.models import User
+
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users in a throwaway test database and log them in through "
+        "POST /service/login/ from concurrent clients. Reports logins per "
+        "second, per core of the hashing pool, latency percentiles and how "
+        "many logins were rejected because the pool was saturated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=None,
+            help="PBKDF2 iterations, PASSWORD_PBKDF2_ITERATIONS by default",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"]:
+            settings.PASSWORD_PBKDF2_ITERATIONS = options["iterations"]
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            phones = self.seed(options["users"])
+            latencies, statuses, elapsed = self.run(
+                phones, options["logins"], options["concurrency"]
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        cores = min(settings.HASHING_POOL_SIZE, os.cpu_count() or 1)
+        succeeded = statuses.count(200)
+        cuts = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"iterations {settings.PASSWORD_PBKDF2_ITERATIONS}, "
+            f"pool {settings.HASHING_POOL_SIZE} threads "
+            f"(+{settings.HASHING_QUEUE_LIMIT} queued), "
+            f"{options['concurrency']} clients"
+        )
+        self.stdout.write(
+            f"{succeeded / elapsed:.1f} logins/s, "
+            f"{succeeded / elapsed / cores:.1f} logins/s per core"
+        )
+        self.stdout.write(
+            f"p50 {cuts[49] * 1000:.1f} ms, p95 {cuts[94] * 1000:.1f} ms, "
+            f"p99 {cuts[98] * 1000:.1f} ms"
+        )
+        self.stdout.write(
+            f"{succeeded} ok, {statuses.count(503)} rejected with 503, "
+            f"{len(statuses) - succeeded - statuses.count(503)} other"
+        )
+
+    @staticmethod
+    def seed(count):
+        encoded = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(phone_number=f"+38099{number:07d}", password=encoded, is_active=True)
+            for number in range(count)
+        )
+        return [user.phone_number for user in users]
+
+    @staticmethod
+    def run(phones, total, concurrency):
+        latencies, statuses = [], []
+        remaining = iter(range(total))
+        lock = threading.Lock()
+
+        def client():
+            http = Client()
+            while True:
+                with lock:
+                    number = next(remaining, None)
+                if number is None:
+                    break
+                body = {
+                    "phone_number": phones[number % len(phones)],
+                    "password": PASSWORD,
+                }
+                began = time.perf_counter()
+                response = http.post(
+                    "/service/login/", json.dumps(body), content_type="application/json"
+                )
+                with lock:
+                    latencies.append(time.perf_counter() - began)
+                    statuses.append(response.status_code)
+            connections.close_all()
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, statuses, time.perf_counter() - began
@@ -0,0 +1,98 @@
+"""Fail when a hot query of the service is planned as a sequential scan"""
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from src.db_queries import get_customer_billings_by_id
+from src.models import Invoice, Request
+
+SQLITE_TABLE_SCAN = re.compile(r"\bSCAN \w+$", re.MULTILINE)
+
+
+def hot_queries(customer_id, request_id):
+    """Querysets behind RequestsAPISet, InvoiceAPISet and db_queries lookups"""
+    requests = Request.objects.all()
+    invoices = Invoice.objects.all()
+    return {
+        "cabinet customer list": requests.filter(customer_id=customer_id).order_by(
+            "-id"
+        )[:10],
+        "cabinet customer keyset page": requests.filter(
+            customer_id=customer_id, id__lt=request_id
+        ).order_by("-id")[:11],
+        "cabinet customer status filter": requests.filter(
+            customer_id=customer_id, status=Request.Statuses.DONE
+        ).order_by("-id")[:10],
+        "cabinet phone_model filter": requests.filter(phone_model="iphone").order_by(
+            "-id"
+        )[:10],
+        "cabinet status filter": requests.filter(
+            status=Request.Statuses.PROCESS
+        ).order_by("-id")[:10],
+        "billing by customer": get_customer_billings_by_id(customer_id),
+        "billing by request and status": invoices.filter(
+            request_id=request_id, status=Invoice.Statuses.UNPAID
+        ),
+        "billing status filter": invoices.filter(
+            status=Invoice.Statuses.UNPAID
+        ).order_by("-id")[:10],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN for every hot query and exit with an error if any of them "
+        "reads a whole table. Sequential scans are disabled in the planner on "
+        "PostgreSQL, so a Seq Scan or an index scan without an index condition "
+        "in the plan means no usable index exists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        vendor = connections[database].vendor
+        failed = []
+        with transaction.atomic(using=database):
+            if vendor == "postgresql":
+                with connections[database].cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset in hot_queries(customer_id=1, request_id=1).items():
+                queryset = queryset.using(database)
+                if vendor == "postgresql":
+                    plan = queryset.explain(format="json")
+                    full_scans = list(self.postgresql_full_scans(json.loads(plan)))
+                elif vendor == "sqlite":
+                    plan = queryset.explain()
+                    full_scans = SQLITE_TABLE_SCAN.findall(plan)
+                else:
+                    raise CommandError(f"Query plans of {vendor} are not supported")
+
+                if full_scans:
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(f"FULL SCAN {name}"))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"ok        {name}"))
+                    if options["verbosity"] > 1:
+                        self.stdout.write(plan)
+        if failed:
+            raise CommandError(f"{len(failed)} hot queries scan a whole table")
+
+    def postgresql_full_scans(self, plan):
+        """Yield plan nodes that read every row of a relation"""
+        if isinstance(plan, list):
+            for node in plan:
+                yield from self.postgresql_full_scans(node)
+            return
+        node = plan.get("Plan", plan)
+        node_type = node.get("Node Type", "")
+        if node_type == "Seq Scan" or (
+            node_type in ("Index Scan", "Index Only Scan") and "Index Cond" not in node
+        ):
+            yield node
+        for child in node.get("Plans", []):
+            yield from self.postgresql_full_scans(child)
@@ -0,0 +1,45 @@
+"""Stream requests or invoices to a CSV or JSONL file"""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from src.export import INVOICE_FIELDS, REQUEST_FIELDS, export_chunks
+from src.models import Invoice, Request
+
+EXPORTS = {
+    "requests": (Request, REQUEST_FIELDS, "customer_id"),
+    "invoices": (Invoice, INVOICE_FIELDS, "request__customer_id"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every request or invoice through a server side cursor. "
+        "Memory use does not depend on the number of rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=EXPORTS)
+        parser.add_argument("--format", choices=("csv", "jsonl"), default="jsonl")
+        parser.add_argument(
+            "--output", help="File to write, standard output if omitted"
+        )
+        parser.add_argument(
+            "--customer", type=int, help="Only export the rows of this customer"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        model, fields, customer_lookup = EXPORTS[options["model"]]
+        queryset = model.objects.all()
+        if options["customer"] is not None:
+            queryset = queryset.filter(**{customer_lookup: options["customer"]})
+
+        chunks = export_chunks(
+            queryset, fields, options["format"], chunk_size=options["chunk_size"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as file:
+                file.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
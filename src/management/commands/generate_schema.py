@@ -0,0 +1,40 @@
+"""Write the OpenAPI document served at /?format=openapi"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from drf_yasg.renderers import OpenAPIRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI document of the schema view and write it to "
+        "OPENAPI_SCHEMA_FILE, where the running site reads it instead of "
+        "introspecting every view. Run it on deploy, after code changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Path to write, OPENAPI_SCHEMA_FILE by default",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"] or settings.OPENAPI_SCHEMA_FILE
+        path = reverse("schema-swagger-ui")
+        view_func = resolve(path).func
+        view = view_func.cls.as_view(
+            **{
+                **view_func.initkwargs,
+                "renderer_classes": [OpenAPIRenderer],
+                "use_precomputed": False,
+            }
+        )
+        response = view(RequestFactory().get(path, {"format": "openapi"}))
+        response.render()
+        if response.status_code != 200:
+            raise CommandError(f"Schema view answered {response.status_code}")
+        with open(output, "wb") as file:
+            file.write(response.content)
+        self.stdout.write(f"Wrote {len(response.content)} bytes to {output}")
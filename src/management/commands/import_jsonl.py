@@ -0,0 +1,94 @@
+"""Load users, requests and invoices from a JSONL dump"""
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.importer import Importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a JSONL file of users, requests and invoices into the database. "
+        "Rows are validated with the API rules and written in batches, with "
+        "COPY on PostgreSQL and bulk_create elsewhere. The last committed line "
+        "is kept in <file>.checkpoint so an interrupted run can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file to load")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and start from the first line",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Stop at the first invalid row instead of skipping it",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk_create even on PostgreSQL",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        checkpoint = f"{path}.checkpoint"
+        start = 0 if options["restart"] else self.read_checkpoint(checkpoint)
+        importer = Importer(
+            use_copy=False if options["no_copy"] else None, strict=options["strict"]
+        )
+
+        loaded = rejected = 0
+        began = time.monotonic()
+        with open(path, encoding="utf-8") as source:
+            lines = (
+                (number, text)
+                for number, text in enumerate(source, 1)
+                if number > start and text.strip()
+            )
+            while True:
+                batch = list(islice(lines, options["batch_size"]))
+                if not batch:
+                    break
+                batch_began = time.monotonic()
+                written, errors = importer.load_batch(batch)
+                for number, error in errors:
+                    self.stderr.write(f"line {number}: {error}")
+                if errors and options["strict"]:
+                    raise CommandError(
+                        f"Stopped at line {errors[0][0]}, nothing from this batch "
+                        f"was written. Resume after fixing the file."
+                    )
+                self.write_checkpoint(checkpoint, batch[-1][0])
+                loaded += written
+                rejected += len(errors)
+                elapsed = time.monotonic() - batch_began
+                self.stdout.write(
+                    f"lines {batch[0][0]}-{batch[-1][0]}: {written} rows "
+                    f"({written / elapsed if elapsed else 0:.0f} rows/s)"
+                )
+
+        elapsed = time.monotonic() - began
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {loaded} rows, rejected {rejected}, in {elapsed:.1f}s "
+                f"({loaded / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+
+    @staticmethod
+    def read_checkpoint(checkpoint):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as file:
+            return int(file.read().strip() or 0)
+
+    @staticmethod
+    def write_checkpoint(checkpoint, number):
+        with open(checkpoint, "w") as file:
+            file.write(str(number))
@@ -0,0 +1,22 @@
+"""Delete old tombstones from the change log"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from src.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove tombstones of deleted requests and invoices older than "
+        "SYNC_TOMBSTONE_DAYS. Sync tokens issued before that are already "
+        "rejected, so no client still needs them."
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} tombstones older than "
+                f"{settings.SYNC_TOMBSTONE_DAYS} days"
+            )
+        )
@@ -0,0 +1,48 @@
+"""Delete expired outstanding and blacklisted JWTs in small batches"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove expired rows from the token blacklist tables. Each batch is "
+        "deleted in its own short transaction, so the tables stay writable "
+        "for logins and logouts while the job runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches",
+        )
+
+    def handle(self, *args, **options):
+        expired = OutstandingToken.objects.filter(expires_at__lte=aware_utcnow())
+        total = 0
+        while True:
+            ids = list(
+                expired.order_by("pk").values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(pk__in=ids).delete()
+            total += len(ids)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"deleted {total} expired tokens")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired tokens"))
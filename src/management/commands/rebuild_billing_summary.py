@@ -0,0 +1,32 @@
+"""Rebuild the per-customer billing summary and verify it against the invoices"""
+from django.core.management.base import BaseCommand, CommandError
+
+from src import billing
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the billing summary table from the invoice table, then check "
+        "that both agree. With --check the table is only verified."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the summary with the raw aggregate",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            billing.rebuild()
+            self.stdout.write("Billing summary rebuilt")
+
+        mismatches = billing.find_mismatches()
+        for (customer_id, status), expected, stored in mismatches:
+            self.stdout.write(
+                f"customer {customer_id} {status}: expected {expected}, stored {stored}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} billing summary rows are wrong")
+        self.stdout.write(self.style.SUCCESS("Billing summary matches the invoices"))
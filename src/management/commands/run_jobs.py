@@ -0,0 +1,38 @@
+"""Run the background jobs of src.jobs"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from src.jobs import HANDLERS, Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Claim due background jobs from the database and run them on a pool "
+        "of threads, retrying failures with backoff. Workers on PostgreSQL "
+        "claim with SELECT ... FOR UPDATE SKIP LOCKED, so any number of them "
+        "can run side by side. SIGTERM and SIGINT finish the running jobs "
+        "and exit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Jobs run at once, JOBS_CONCURRENCY by default",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when no job is due"
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(options["concurrency"] or settings.JOBS_CONCURRENCY)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write(
+            f"Running {', '.join(sorted(HANDLERS))} jobs, "
+            f"{worker.concurrency} at a time"
+        )
+        worker.run(once=options["once"])
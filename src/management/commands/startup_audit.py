@@ -0,0 +1,135 @@
+"""Measure cold start and what each installed app costs to import"""
+import os
+import re
+import runpy
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a gunicorn master does before forking with preload_app and when_ready
+STARTUP = (
+    "import django; django.setup(); "
+    "from django.core.wsgi import get_wsgi_application; get_wsgi_application(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh interpreters that load the project the way the production "
+        "server does, report the cold start time against a target, and break "
+        "the import time down per INSTALLED_APPS entry and other top level "
+        "packages, so heavy apps (drf_yasg, admin) stand out. Fails when "
+        "gunicorn.conf.py runs several workers without a shared cache, and "
+        "outside DEBUG when METRICS_TOKEN is empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--target",
+            type=float,
+            default=2.0,
+            help="Cold start budget in seconds; exceeding it fails the command",
+        )
+        parser.add_argument("--top", type=int, default=15)
+
+    def handle(self, *args, **options):
+        self.check_workers()
+        self.check_metrics_token()
+        path = os.pathsep.join(
+            filter(None, [str(settings.BASE_DIR), os.environ.get("PYTHONPATH")])
+        )
+        env = {**os.environ, "PYTHONPATH": path}
+        # The first run also writes bytecode caches, it is not counted
+        self.start(env)
+        timings = [self.start(env) for _ in range(options["runs"])]
+        apps = [app.split(".apps.")[0] for app in settings.INSTALLED_APPS]
+        per_app = self.import_costs(env, apps)
+
+        total = sum(per_app.values())
+        self.stdout.write(f"{'package':<45} {'import ms':>10} {'share':>7}")
+        for owner, microseconds in per_app.most_common(options["top"]):
+            marker = "*" if owner in apps else " "
+            self.stdout.write(
+                f"{marker}{owner:<44} {microseconds / 1000:>10.1f} "
+                f"{microseconds / total:>7.1%}"
+            )
+        self.stdout.write("* installed app")
+
+        cold_start = statistics.median(timings)
+        self.stdout.write(
+            f"Cold start median {cold_start:.2f}s over {len(timings)} runs "
+            f"(min {min(timings):.2f}s), target {options['target']:.2f}s"
+        )
+        if cold_start > options["target"]:
+            raise CommandError("Cold start is over the target")
+
+    @staticmethod
+    def check_workers():
+        """Workers of gunicorn.conf.py only agree on cached state they share"""
+        workers = runpy.run_path(str(settings.BASE_DIR / "gunicorn.conf.py"))["workers"]
+        if workers > 1 and not settings.SHARED_CACHE:
+            raise CommandError(
+                f"gunicorn runs {workers} workers on a per-process cache, "
+                "set REDIS_URL or WEB_CONCURRENCY=1"
+            )
+
+    @staticmethod
+    def check_metrics_token():
+        """/metrics is not served in production without its token"""
+        if not settings.DEBUG and not settings.METRICS_TOKEN:
+            raise CommandError("/metrics needs a bearer token, set METRICS_TOKEN")
+
+    @staticmethod
+    def run(env, *options):
+        result = subprocess.run(
+            [sys.executable, *options, "-c", STARTUP],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Startup failed:\n{result.stderr}")
+        return result
+
+    def start(self, env):
+        began = time.perf_counter()
+        self.run(env)
+        return time.perf_counter() - began
+
+    def import_costs(self, env, apps):
+        """
+        Import time in microseconds of each installed app, including the
+        third-party modules it imports first, and of other top level packages
+        """
+        result = self.run(env, "-X", "importtime")
+        entries = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match:
+                depth = len(match.group(3)) // 2
+                entries.append((depth, match.group(4), int(match.group(1))))
+
+        costs = Counter()
+        owners = {}
+        # A module is listed after the modules it imports, one level deeper,
+        # so walking backwards meets every importer before its imports.
+        for depth, module, microseconds in reversed(entries):
+            owner = max(
+                (app for app in apps if module == app or module.startswith(app + ".")),
+                key=len,
+                default=None,
+            )
+            if owner is None:
+                owner = owners.get(depth - 1) or module.split(".")[0]
+            owners[depth] = owner
+            costs[owner] += microseconds
+        return costs
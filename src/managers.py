@@ -1,11 +1,61 @@
 """Module needed to create for custom user module and setting authentication
  and registration solutions"""
 from django.contrib.auth.models import BaseUserManager
+from django.db import models, transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from rest_framework.serializers import ValidationError
 
 
-class UserManager(BaseUserManager):
+def forget_token_versions(user_ids, using):
+    """Drop the cached token versions of ``user_ids`` once the write commits"""
+    # src.authentication imports the models, which import this module
+    from src.authentication import forget_token_version
+
+    def forget():
+        for user_id in user_ids:
+            forget_token_version(user_id)
+
+    transaction.on_commit(forget, using=using)
+
+
+class UserQuerySet(models.QuerySet):
+    """
+    Bulk writes that revoke issued tokens like ``User.save`` does: changing a
+    claim field also bumps ``token_version``.
+    """
+
+    def update(self, **kwargs):
+        if not set(kwargs) & set(self.model.CLAIM_FIELDS):
+            return super().update(**kwargs)
+        kwargs.setdefault("token_version", F("token_version") + 1)
+        with transaction.atomic(using=self.db):
+            user_ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            forget_token_versions(user_ids, self.db)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if not set(fields) & set(self.model.CLAIM_FIELDS):
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        objs = list(objs)
+        changed = []
+        for user in objs:
+            loaded = getattr(user, "_loaded_claims", None)
+            if loaded is None or loaded != user.get_claim_values():
+                user.token_version += 1
+                changed.append(user.pk)
+        with transaction.atomic(using=self.db):
+            rows = super().bulk_update(
+                objs, [*fields, "token_version"], batch_size=batch_size
+            )
+            forget_token_versions(changed, self.db)
+        for user in objs:
+            user._loaded_claims = user.get_claim_values()
+        return rows
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Base class rewriting"""
 
     def create_user(self, phone_number, password, **extra_fields):
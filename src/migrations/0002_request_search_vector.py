@@ -0,0 +1,57 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=["search_vector"], name="src_request_search_gin"
+)
+
+CREATE_TRIGGER = """
+CREATE TRIGGER src_request_search_vector_update
+BEFORE INSERT OR UPDATE OF problem_description, search_vector ON src_request
+FOR EACH ROW EXECUTE PROCEDURE
+tsvector_update_trigger(search_vector, 'pg_catalog.english', problem_description);
+UPDATE src_request SET search_vector = to_tsvector('pg_catalog.english', problem_description);
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS src_request_search_vector_update ON src_request;"
+
+
+def create_search_backend(apps, schema_editor):
+    """GIN index and trigger only exist on PostgreSQL, other backends search with LIKE"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.add_index(apps.get_model("src", "Request"), SEARCH_INDEX)
+    schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_search_backend(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(DROP_TRIGGER)
+    schema_editor.remove_index(apps.get_model("src", "Request"), SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="request",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="request", index=SEARCH_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_backend, drop_search_backend),
+            ],
+        ),
+    ]
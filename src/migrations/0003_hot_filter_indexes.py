@@ -0,0 +1,47 @@
+# Generated by Django 4.1 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0002_request_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["request", "status"],
+                include=("price",),
+                name="src_invoice_req_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["status", "-id"], name="src_invoice_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["customer", "-id"], name="src_request_cust_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["customer", "status", "-id"], name="src_request_cust_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["phone_model", "-id"], name="src_request_phone_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(fields=["status", "-id"], name="src_request_status_idx"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.1 on 2026-10-18 09:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def summarise_existing_invoices(apps, schema_editor):
+    """Start the summary from the invoices already there, as rebuild_billing_summary"""
+    Invoice = apps.get_model("src", "Invoice")
+    BillingSummary = apps.get_model("src", "BillingSummary")
+    rows = (
+        Invoice.objects.values("status", customer_id=models.F("request__customer_id"))
+        .annotate(invoice_count=models.Count("id"), total=models.Sum("price"))
+        .order_by()
+    )
+    BillingSummary.objects.bulk_create(
+        (BillingSummary(**row) for row in rows.iterator(2000)), batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0004_user_token_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BillingSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("UNPAID", "UNPAID"), ("PAID", "PAID")], max_length=30
+                    ),
+                ),
+                ("invoice_count", models.BigIntegerField(default=0)),
+                ("total", models.FloatField(default=0)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="billingsummary",
+            constraint=models.UniqueConstraint(
+                fields=("customer", "status"), name="src_billingsummary_unique"
+            ),
+        ),
+        migrations.RunPython(summarise_existing_invoices, migrations.RunPython.noop),
+    ]
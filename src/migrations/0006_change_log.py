@@ -0,0 +1,77 @@
+# Generated by Django 4.1 on 2026-10-18 09:31
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def log_existing_rows(apps, schema_editor):
+    """Start the change log with one change per existing request and invoice"""
+    Change = apps.get_model("src", "Change")
+    sources = (
+        ("request", apps.get_model("src", "Request"), "customer_id"),
+        ("invoice", apps.get_model("src", "Invoice"), None),
+    )
+    for kind, model, customer_field in sources:
+        fields = ("pk", customer_field) if customer_field else ("pk",)
+        rows = model.objects.order_by("pk").values_list(*fields).iterator(2000)
+        batch = []
+        for row in rows:
+            customer_id = row[1] if customer_field else None
+            batch.append(Change(kind=kind, object_id=row[0], customer_id=customer_id))
+            if len(batch) == 2000:
+                Change.objects.bulk_create(batch)
+                batch = []
+        Change.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0005_billing_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("request", "request"), ("invoice", "invoice")],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("customer_id", models.BigIntegerField(null=True)),
+                ("deleted", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                fields=["kind", "object_id", "customer_id"],
+                name="src_change_object_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                fields=["customer_id", "id"], name="src_change_customer_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["kind", "id"], name="src_change_kind_idx"),
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0006_change_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
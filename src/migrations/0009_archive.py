@@ -0,0 +1,79 @@
+# Generated by Django 4.1 on 2026-10-18 09:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0008_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedRequest",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("PROCESS", "PROCESS"), ("DONE", "DONE")],
+                        max_length=30,
+                    ),
+                ),
+                ("phone_model", models.CharField(max_length=10)),
+                ("problem_description", models.TextField(max_length=255)),
+                ("version", models.PositiveIntegerField(default=1)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedInvoice",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("price", models.FloatField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("UNPAID", "UNPAID"), ("PAID", "PAID")], max_length=30
+                    ),
+                ),
+                ("request_id", models.BigIntegerField()),
+                ("version", models.PositiveIntegerField(default=1)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="archivedrequest",
+            index=models.Index(
+                fields=["customer", "-id"], name="src_archreq_cust_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedinvoice",
+            index=models.Index(fields=["request_id"], name="src_archinv_request_idx"),
+        ),
+    ]
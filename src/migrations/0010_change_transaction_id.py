@@ -0,0 +1,68 @@
+from django.db import migrations, models
+
+CREATE_TRIGGER = """
+CREATE FUNCTION src_change_set_transaction_id() RETURNS trigger AS $$
+BEGIN
+    NEW.transaction_id := txid_current();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER src_change_transaction_id
+BEFORE INSERT ON src_change
+FOR EACH ROW EXECUTE PROCEDURE src_change_set_transaction_id();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS src_change_transaction_id ON src_change;
+DROP FUNCTION IF EXISTS src_change_set_transaction_id();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    """Only PostgreSQL runs writers concurrently, other backends keep 0"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("src", "0009_archive"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="change",
+            name="src_change_customer_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="change",
+            name="src_change_kind_idx",
+        ),
+        migrations.AddField(
+            model_name="change",
+            name="transaction_id",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                fields=["customer_id", "transaction_id", "id"],
+                name="src_change_customer_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                fields=["kind", "transaction_id", "id"], name="src_change_kind_idx"
+            ),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
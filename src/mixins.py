@@ -0,0 +1,201 @@
+"""Reusable viewset behaviour"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from src.export import CONTENT_TYPES, export_chunks
+from src.signals import send_rows_written
+
+
+class BulkModelMixin:
+    """
+    ``POST <list>/bulk/`` creates and ``PUT <list>/bulk/`` updates a list of rows.
+    The whole list is validated first and written in one transaction with
+    ``bulk_create``/``bulk_update``. If any item is invalid nothing is written
+    and the response holds one error object per item, in payload order.
+    """
+
+    bulk_update_fields = ()
+
+    @action(detail=False, methods=["post", "put"], url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise serializers.ValidationError("Expected a non-empty list of items.")
+        if len(items) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"A bulk request accepts at most {settings.BULK_MAX_ITEMS} items."
+            )
+        if not all(isinstance(item, dict) for item in items):
+            raise serializers.ValidationError("Every item must be an object.")
+
+        with transaction.atomic():
+            if request.method == "POST":
+                return self.bulk_create(items)
+            return self.bulk_update(items)
+
+    def prepare_bulk_item(self, item):
+        """Hook to fill server side defaults into one payload item"""
+        return item
+
+    def check_bulk_update(self, instance, item):
+        """Hook returning an error message when ``instance`` may not be changed"""
+        return None
+
+    def get_bulk_update_fields(self):
+        return self.bulk_update_fields
+
+    def prefetch_bulk_related(self, items):
+        """Hook returning related rows of all items, keyed by field name then pk"""
+        return {}
+
+    def bulk_create(self, items):
+        serializer = self.get_serializer(
+            data=[self.prepare_bulk_item(item) for item in items], many=True
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_bulk_create(self, serializer):
+        serializer.save()
+
+    def bulk_update(self, items):
+        ids = [item.get("id") for item in items]
+        instances = (
+            self.filter_queryset(self.get_queryset())
+            .select_for_update()
+            .order_by("pk")
+            .in_bulk([pk for pk in ids if isinstance(pk, int)])
+        )
+
+        prefetched = self.prefetch_bulk_related(items)
+        seen, errors, valid = set(), [], []
+        for pk, item in zip(ids, items):
+            instance = instances.get(pk)
+            if instance is None:
+                errors.append({"id": ["Not found."]})
+                continue
+            if pk in seen:
+                errors.append({"id": ["Duplicate id."]})
+                continue
+            seen.add(pk)
+            message = self.check_bulk_update(instance, item)
+            if message:
+                errors.append({"non_field_errors": [message]})
+                continue
+            serializer = self.get_serializer(
+                instance, data=self.prepare_bulk_item(item)
+            )
+            for name, rows in prefetched.items():
+                serializer.fields[name].prefetched = rows
+            if serializer.is_valid():
+                valid.append(serializer)
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        for serializer in valid:
+            for attr, value in serializer.validated_data.items():
+                setattr(serializer.instance, attr, value)
+        self.perform_bulk_update([serializer.instance for serializer in valid])
+        return Response([serializer.data for serializer in valid])
+
+    def perform_bulk_update(self, instances):
+        model = self.get_queryset().model
+        model.objects.bulk_update(instances, self.get_bulk_update_fields())
+        send_rows_written(model, instances, created=False)
+
+
+class ExportMixin:
+    """
+    ``GET <list>/export/csv/`` and ``GET <list>/export/jsonl/`` stream every row
+    the caller may list, with the same scoping and filters as the list action.
+    """
+
+    export_fields = ()
+
+    @action(detail=False, methods=["get"], url_path=r"export/(?P<output>csv|jsonl)")
+    def export(self, request, output, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export_chunks(queryset, self.export_fields, output),
+            content_type=CONTENT_TYPES[output],
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="{self.basename}.{output}"'
+        return response
+
+
+class FacetsMixin:
+    """
+    ``GET <list>/facets/`` counts the rows the caller may list per value of
+    each of ``facet_fields`` in one grouped query, with the search and filters
+    of the list action. A facet's own filter is left out of its counts, the
+    others apply, so each count is what picking that value would list. Needs
+    ``ResponseCacheMixin``; counts are cached for ``FACETS_CACHE_TIMEOUT``.
+    """
+
+    facet_fields = ()
+    # Values returned per facet, most frequent first
+    facet_limit = 100
+    ignored_filter_fields = ()
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request, *args, **kwargs):
+        self.response_cache_timeout = settings.FACETS_CACHE_TIMEOUT
+        return self.cached_response(self.count_facets)
+
+    def get_facet_querysets(self):
+        """Filtered querysets the list reads from, counted together"""
+        return [self.filter_queryset(self.get_queryset())]
+
+    def count_facets(self):
+        # Filtering the list queryset validates every filter, facets included
+        self.filter_queryset(self.get_queryset())
+        self.ignored_filter_fields = self.facet_fields
+        try:
+            querysets = self.get_facet_querysets()
+        finally:
+            self.ignored_filter_fields = ()
+        rows = [
+            row
+            for queryset in querysets
+            for row in queryset.values_list(*self.facet_fields)
+            .annotate(count=Count("pk"))
+            .order_by()
+        ]
+
+        params = self.request.query_params
+        selected = {
+            field: params[field] for field in self.facet_fields if params.get(field)
+        }
+        counts = {field: Counter() for field in self.facet_fields}
+        total = 0
+        for *values, count in rows:
+            row = dict(zip(self.facet_fields, values))
+            mismatched = {
+                field for field, value in selected.items() if str(row[field]) != value
+            }
+            if not mismatched:
+                total += count
+            for field in self.facet_fields:
+                if not mismatched - {field}:
+                    counts[field][row[field]] += count
+        facets = {}
+        for field, values in counts.items():
+            ranked = sorted(values.items(), key=lambda item: (-item[1], str(item[0])))
+            facets[field] = [
+                {"value": value, "count": count}
+                for value, count in ranked[: self.facet_limit]
+            ]
+        return Response({"count": total, "facets": facets})
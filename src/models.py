@@ -1,8 +1,11 @@
 """Models module"""
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from src import hashers
 from src.managers import UserManager
 
 
@@ -23,12 +26,14 @@ class User(AbstractUser):
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)
     last_login = models.DateTimeField(default=timezone.now)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     username = None
     first_name = None
     last_name = None
     email = None
 
     USERNAME_FIELD = "phone_number"
+    CLAIM_FIELDS = ("role", "is_staff", "is_active")
     EMAIL_FIELD = None
 
     objects = UserManager()
@@ -40,8 +45,96 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.role} := {self.phone_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_claims = user.get_claim_values()
+        return user
 
-class Request(models.Model):
+    def get_claim_values(self):
+        """Fields copied into JWT claims, None when any of them is deferred"""
+        loaded = self.__dict__
+        if not all(name in loaded for name in self.CLAIM_FIELDS):
+            return None
+        return tuple(loaded[name] for name in self.CLAIM_FIELDS)
+
+    def save(self, *args, **kwargs):
+        """
+        Bump ``token_version`` when a claim changes so issued tokens stop
+        working. ``UserQuerySet`` does the same for ``update``/``bulk_update``.
+        """
+        loaded = getattr(self, "_loaded_claims", None)
+        if loaded is not None and loaded != self.get_claim_values():
+            self.token_version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        self._loaded_claims = self.get_claim_values()
+
+    def set_password(self, raw_password):
+        """Hash on the bounded hashing pool instead of the request thread"""
+        self.password = hashers.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """Verify on the hashing pool, rehashing with the tuned hasher on success"""
+
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return hashers.check_password(raw_password, self.password, setter)
+
+
+class TrackedModel(models.Model):
+    """Model that remembers the column values it was loaded with,
+    so signal receivers can tell what a write changed"""
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.reset_loaded_values()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.reset_loaded_values()
+
+    def reset_loaded_values(self):
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+
+class VersionedModel(TrackedModel):
+    """Model whose ``version`` goes up with every write, see src.concurrency"""
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
+        super().save(*args, **kwargs)
+
+
+class Request(VersionedModel):
     """Request model"""
 
     class Statuses(models.TextChoices):
@@ -54,9 +147,22 @@ class Request(models.Model):
     phone_model = models.CharField(max_length=10)
     problem_description = models.TextField(max_length=255)
     customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Maintained by a database trigger on PostgreSQL, see migration 0002
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="src_request_search_gin"),
+            models.Index(fields=["customer", "-id"], name="src_request_cust_id_idx"),
+            models.Index(
+                fields=["customer", "status", "-id"], name="src_request_cust_status_idx"
+            ),
+            models.Index(fields=["phone_model", "-id"], name="src_request_phone_idx"),
+            models.Index(fields=["status", "-id"], name="src_request_status_idx"),
+        ]
 
 
-class Invoice(models.Model):
+class Invoice(VersionedModel):
     """Invoice model"""
 
     class Statuses(models.TextChoices):
@@ -68,3 +174,136 @@ class Invoice(models.Model):
         choices=Statuses.choices, default=Statuses.UNPAID, max_length=30
     )
     request = models.ForeignKey(Request, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["request", "status"],
+                include=["price"],
+                name="src_invoice_req_status_idx",
+            ),
+            models.Index(fields=["status", "-id"], name="src_invoice_status_idx"),
+        ]
+
+
+class ArchivedRequest(models.Model):
+    """Finished request moved out of ``Request`` by ``archive_data``, see src.archive"""
+
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(choices=Request.Statuses.choices, max_length=30)
+    phone_model = models.CharField(max_length=10)
+    problem_description = models.TextField(max_length=255)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["customer", "-id"], name="src_archreq_cust_id_idx"),
+        ]
+
+
+class ArchivedInvoice(models.Model):
+    """Paid invoice moved out of ``Invoice`` by ``archive_data``, see src.archive"""
+
+    id = models.BigIntegerField(primary_key=True)
+    price = models.FloatField()
+    status = models.CharField(choices=Invoice.Statuses.choices, max_length=30)
+    # Not a foreign key: the request may be archived or not
+    request_id = models.BigIntegerField()
+    # Customer of the request, so billing does not have to find the request
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["request_id"], name="src_archinv_request_idx"),
+        ]
+
+
+class BillingSummary(models.Model):
+    """Invoice count and total per customer and invoice status, see src.billing"""
+
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(choices=Invoice.Statuses.choices, max_length=30)
+    invoice_count = models.BigIntegerField(default=0)
+    total = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["customer", "status"], name="src_billingsummary_unique"
+            )
+        ]
+
+
+class Change(models.Model):
+    """
+    Latest write to a request or invoice as seen by one customer, see src.changes.
+    Clients sync in (``transaction_id``, ``id``) order; a deleted row, or a
+    request moved to another customer, leaves a tombstone.
+    """
+
+    class Kinds(models.TextChoices):
+        REQUEST = "request", _("request")
+        INVOICE = "invoice", _("invoice")
+
+    kind = models.CharField(choices=Kinds.choices, max_length=10)
+    object_id = models.BigIntegerField()
+    # Not a foreign key: tombstones have to outlive the customer they belong to
+    customer_id = models.BigIntegerField(null=True)
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Id of the writing transaction, set by a trigger on PostgreSQL (migration
+    # 0010). Other backends commit one writer at a time and keep 0.
+    transaction_id = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["kind", "object_id", "customer_id"],
+                name="src_change_object_idx",
+            ),
+            models.Index(
+                fields=["customer_id", "transaction_id", "id"],
+                name="src_change_customer_idx",
+            ),
+            models.Index(
+                fields=["kind", "transaction_id", "id"], name="src_change_kind_idx"
+            ),
+        ]
+
+
+class Job(models.Model):
+    """
+    Background task written in the transaction of the change that asked for it
+    and run by the ``run_jobs`` worker, see src.jobs
+    """
+
+    class Statuses(models.TextChoices):
+        PENDING = "PENDING", _("PENDING")
+        RUNNING = "RUNNING", _("RUNNING")
+        DONE = "DONE", _("DONE")
+        FAILED = "FAILED", _("FAILED")
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        choices=Statuses.choices, default=Statuses.PENDING, max_length=10
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # A running job whose worker died is claimed again once this has passed
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="src_job_status_run_at_idx"),
+            models.Index(fields=["finished_at"], name="src_job_finished_idx"),
+        ]
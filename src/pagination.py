@@ -0,0 +1,177 @@
+"""Pagination classes for the service endpoints"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination over the primary key, newest rows first.
+    Every page is a ``WHERE id < <last seen id>`` range read on an index, so its
+    cost does not grow with depth. The cursor is opaque to clients and no
+    ``COUNT(*)`` is issued unless ``?count=true`` is passed.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    key_field = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        if self.wants_count(request):
+            self.count = queryset.count()
+        return self.build_page(list(page_queryset))
+
+    def get_page_queryset(self, queryset, request):
+        """Prepare paging state and return the lazy queryset of one page (plus one row)"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        self.key, self.reverse = self.decode_cursor(request)
+
+        if self.key is None:
+            queryset = queryset.order_by(f"-{self.key_field}")
+        elif self.reverse:
+            queryset = self.seek(queryset, **{f"{self.key_field}__gt": self.key})
+            queryset = queryset.order_by(self.key_field)
+        else:
+            queryset = self.seek(queryset, **{f"{self.key_field}__lt": self.key})
+            queryset = queryset.order_by(f"-{self.key_field}")
+        return queryset[: self.page_size + 1]
+
+    @staticmethod
+    def seek(queryset, **lookups):
+        """``filter()`` that also takes a ``union()``, filtering each of its parts"""
+        if not queryset.query.combinator:
+            return queryset.filter(**lookups)
+        queryset = queryset.all()
+        for part in queryset.query.combined_queries:
+            part.add_q(Q(**lookups))
+        return queryset
+
+    def build_page(self, rows):
+        """Trim the look-ahead row and work out which neighbour pages exist"""
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.key is not None
+        self.page = rows
+        return rows
+
+    def wants_count(self, request):
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ("1", "true")
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_key(self, row):
+        if isinstance(row, dict):
+            return row[self.key_field]
+        return getattr(row, self.key_field)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_key(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_key(self.page[0]), reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            return int(position["k"]), bool(position.get("r"))
+        except (
+            TypeError,
+            ValueError,
+            OverflowError,
+            KeyError,
+            binascii.Error,
+            UnicodeEncodeError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, key, reverse):
+        position = {"k": key, "r": 1} if reverse else {"k": key}
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode("ascii"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def get_paginated_response(self, data):
+        body = OrderedDict()
+        if self.count is not None:
+            body["count"] = self.count
+        body["next"] = self.get_next_link()
+        body["previous"] = self.get_previous_link()
+        body["results"] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class KeysetPaginationMixin:
+    """
+    Viewset mixin that keeps the default page number pagination and switches
+    to ``KeysetPagination`` when the client asks for ``?pagination=keyset``
+    or follows one of its cursors.
+    """
+
+    keyset_pagination_class = KeysetPagination
+    pagination_query_param = "pagination"
+
+    def uses_keyset_pagination(self):
+        request = getattr(self, "request", None)
+        if request is None:
+            return False
+        params = request.query_params
+        return (
+            params.get(self.pagination_query_param) == "keyset"
+            or self.keyset_pagination_class.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.uses_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
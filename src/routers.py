@@ -0,0 +1,155 @@
+"""Route safe reads to read replicas, everything else to the primary"""
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+current = ContextVar("replica_routing", default=None)
+forced_primary = ContextVar("replica_routing_forced_primary", default=False)
+
+
+def sticky_key(user_id):
+    return f"dbrouter:sticky:{user_id}"
+
+
+def request_user_id(request):
+    """Id of the user once authenticated, without triggering authentication"""
+    user = request.__dict__.get("user")
+    if isinstance(user, SimpleLazyObject):
+        user = user._wrapped
+        if user is empty:
+            # Session users are known from the session without loading them
+            session = request.__dict__.get("session")
+            if session is None or not session.session_key:
+                return None
+            return session.get(SESSION_KEY)
+    return getattr(user, "pk", None)
+
+
+class RoutingState:
+    """Where the reads of one request may go"""
+
+    def __init__(self, request):
+        self.request = request
+        self.primary = request.method not in SAFE_METHODS
+        self.checked_user = None
+        self.sticky = False
+        self.used_replica = False
+
+    def wants_primary(self):
+        if self.primary:
+            return True
+        user_id = request_user_id(self.request)
+        if user_id is not None and user_id != self.checked_user:
+            self.checked_user = user_id
+            self.sticky = cache.get(sticky_key(user_id)) is not None
+        return self.sticky
+
+
+@contextmanager
+def use_primary():
+    """Send the reads of the block to the primary"""
+    token = forced_primary.set(True)
+    try:
+        yield
+    finally:
+        forced_primary.reset(token)
+
+
+def read_from_replica():
+    """Whether the current request has read anything from a replica"""
+    state = current.get()
+    return state is not None and state.used_replica
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads of GET, HEAD and OPTIONS requests go to a random alias of
+    ``REPLICA_DATABASES``, unless they run inside a transaction, in a
+    ``use_primary`` block, or for a user who wrote within the last
+    ``REPLICA_STICKY_SECONDS`` (see ``ReplicaRoutingMiddleware``). Writes,
+    other requests, commands and workers use the primary. Sessions and the
+    token blacklist are always read from the primary, as a login or logout
+    must be seen by the very next request.
+    """
+
+    primary_apps = {"sessions", "token_blacklist"}
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        state = current.get()
+        if (
+            not replicas
+            or state is None
+            or forced_primary.get()
+            or model._meta.app_label in self.primary_apps
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or state.wants_primary()
+        ):
+            return DEFAULT_DB_ALIAS
+        state.used_replica = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track the request for ``PrimaryReplicaRouter`` and, after a successful
+    write by an authenticated user, keep that user's reads on the primary
+    for ``REPLICA_STICKY_SECONDS`` so they read their own writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = current.set(RoutingState(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = current.set(RoutingState(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    @staticmethod
+    def pin_writer(request, response):
+        if not settings.REPLICA_DATABASES or request.method in SAFE_METHODS:
+            return
+        if response.status_code >= 400:
+            return
+        user_id = request_user_id(request)
+        if user_id is not None:
+            cache.set(sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
@@ -0,0 +1,79 @@
+"""OpenAPI document generated once per process instead of on every request"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import quote_etag
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.renderers import (
+    OpenAPIRenderer,
+    SwaggerJSONRenderer,
+    SwaggerYAMLRenderer,
+)
+
+# Renderers of the JSON and YAML documents, as opposed to the HTML UIs
+DOCUMENT_RENDERERS = (OpenAPIRenderer, SwaggerJSONRenderer, SwaggerYAMLRenderer)
+
+
+def read_schema_file():
+    """The document written by ``generate_schema``, or None"""
+    try:
+        with open(settings.OPENAPI_SCHEMA_FILE, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+class PrecomputedSchemaMixin:
+    """
+    Serve the JSON and YAML documents of a drf_yasg ``SchemaView`` from memory
+    with an ETag, so ``If-None-Match`` gets a 304 from ConditionalGetMiddleware.
+    A JSON document is read from ``OPENAPI_SCHEMA_FILE`` when the deploy wrote
+    one with ``generate_schema``. Anything else is generated on the first hit.
+    With ``DEBUG`` the schema is generated on every request, as before.
+    """
+
+    use_precomputed = True
+    documents = {}
+    lock = threading.Lock()
+
+    def get(self, request, version="", format=None):
+        renderer = request.accepted_renderer
+        if (
+            settings.DEBUG
+            or not self.use_precomputed
+            or not isinstance(renderer, DOCUMENT_RENDERERS)
+        ):
+            return super().get(request, version, format)
+
+        key = (type(renderer).__name__, request.version or version or "")
+        document = self.documents.get(key)
+        if document is None:
+            with self.lock:
+                document = self.documents.get(key)
+                if document is None:
+                    document = self.documents[key] = self.precompute(
+                        request, version, format
+                    )
+        content, etag = document
+        response = HttpResponse(
+            content, content_type=f"{renderer.media_type}; charset={renderer.charset}"
+        )
+        response["ETag"] = etag
+        return response
+
+    def precompute(self, request, version, format):
+        renderer = request.accepted_renderer
+        content = None
+        if renderer.codec_class is OpenAPICodecJson and not request.version:
+            content = read_schema_file()
+        if content is None:
+            schema = super().get(request, version, format).data
+            content = renderer.render(schema)
+        return content, quote_etag(hashlib.sha1(content).hexdigest())
+
+
+def precomputed_schema_view(schema_view):
+    """``get_schema_view()`` class serving precomputed documents"""
+    return type("SchemaView", (PrecomputedSchemaMixin, schema_view), {})
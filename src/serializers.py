@@ -1,13 +1,31 @@
 """Serializing module for model instances"""
 import re
+from src.authentication import user_claims
 from src.models import User, Request, Invoice
+from src.signals import send_rows_written
+from src.tokens import CachedRefreshToken
 from src.db_queries import (
-    req_status_by_id,
+    get_requests_by_ids,
 )
+from django.db import transaction
 from django.utils.text import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework_simplejwt.exceptions import TokenError
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+
+def check_phone_number(phone_number):
+    """Phone number rule shared by registration and the bulk importer"""
+    if bool(re.search(r"^\+38\d{10}$", phone_number)) is True:
+        return phone_number
+    raise serializers.ValidationError("Incorrect phone number")
+
+
+def check_request_done(request_status):
+    """Invoices may only be issued for requests that are done"""
+    if request_status == Request.Statuses.PROCESS:
+        raise serializers.ValidationError("This request is being developing")
+    return request_status
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -21,7 +39,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = "__all__"
+        exclude = ("token_version",)
         extra_kwargs = {"password": {"write_only": True}}
         swagger_schema_fields = {
             "example": {
@@ -31,17 +49,28 @@ class RegistrationSerializer(serializers.ModelSerializer):
         }
 
     def validate(self, attrs):
-        if bool(re.search(r"^\+38\d{10}$", attrs["phone_number"])) is True:
-            return attrs
         if "phone_number" not in attrs.keys():
             raise serializers.ValidationError("Not found credentials for registration")
-        else:
-            raise serializers.ValidationError("Incorrect phone number")
+        check_phone_number(attrs["phone_number"])
+        return attrs
 
     def create(self, validated_data):
         return self.Meta.model.objects.create_user(**validated_data)
 
 
+class MyTokenLoginSerializer(TokenObtainPairSerializer):
+    """Issue tokens carrying the claims read by ClaimsJWTAuthentication"""
+
+    token_class = CachedRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
 class MyTokenLogoutSerializer(serializers.Serializer):
     """Remove refresh token for logout"""
 
@@ -56,17 +85,86 @@ class MyTokenLogoutSerializer(serializers.Serializer):
     def save(self, **kwargs):
         """Add token to blacklist for logout"""
         try:
-            RefreshToken(self.token).blacklist()
+            CachedRefreshToken(self.token).blacklist()
         except TokenError:
             self.fail("bad_token")
 
 
+class BulkListSerializer(serializers.ListSerializer):
+    """Create the validated items of a list with a single bulk_create"""
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        instances = model.objects.bulk_create(
+            [model(**attrs) for attrs in validated_data]
+        )
+        send_rows_written(model, instances, created=True)
+        return instances
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that a list serializer can hand the rows it already
+    loaded for all items in one query, through ``prefetched``
+    """
+
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is not None and str(data).isdigit():
+            instance = self.prefetched.get(int(data))
+            if instance is not None:
+                return instance
+        return super().to_internal_value(data)
+
+
+class LockingPrimaryKeyRelatedField(PrefetchedPrimaryKeyRelatedField):
+    """Resolves its row with ``SELECT ... FOR UPDATE`` inside a transaction"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if transaction.get_connection(queryset.db).in_atomic_block:
+            return queryset.select_for_update()
+        return queryset
+
+
+class RequestsListSerializer(BulkListSerializer):
+    """Resolve the customers of all requests in one query before validating them"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            field = self.child.fields["customer"]
+            field.prefetched = self.child.referenced_customers(data)
+        return super().to_internal_value(data)
+
+
+class InvoiceListSerializer(BulkListSerializer):
+    """Resolve the requests of all invoices in one query before validating them"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            field = self.child.fields["request"]
+            field.prefetched = self.child.referenced_requests(data)
+        return super().to_internal_value(data)
+
+
 class RequestsSerializer(serializers.ModelSerializer):
     """Serializer for customer requests"""
 
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
+    invoice_price = serializers.FloatField(
+        write_only=True,
+        required=False,
+        min_value=0,
+        help_text="Price of the invoice issued in the background when this "
+        "update moves the request to DONE",
+    )
+
     class Meta:
         model = Request
-        fields = "__all__"
+        exclude = ("search_vector",)
+        list_serializer_class = RequestsListSerializer
         swagger_schema_fields = {
             "example": {
                 "phone_model": "regular_customer",
@@ -74,13 +172,33 @@ class RequestsSerializer(serializers.ModelSerializer):
             },
         }
 
+    @staticmethod
+    def referenced_customers(items):
+        """Customers referenced by a list of raw request payloads, by id"""
+        ids = {
+            int(item["customer"])
+            for item in items
+            if isinstance(item, dict) and str(item.get("customer")).isdigit()
+        }
+        return User.objects.in_bulk(ids)
+
+    def validate(self, attrs):
+        """Hand ``invoice_price`` to src.jobs on the instance, it is no column"""
+        price = attrs.pop("invoice_price", None)
+        if isinstance(self.instance, Request):
+            self.instance.invoice_price = price
+        return attrs
+
 
 class InvoiceSerializer(serializers.ModelSerializer):
     """Serializer for coming invoices"""
 
+    serializer_related_field = LockingPrimaryKeyRelatedField
+
     class Meta:
         model = Invoice
         fields = "__all__"
+        list_serializer_class = InvoiceListSerializer
         swagger_schema_fields = {
             "example": {
                 "price": 101.23,
@@ -89,9 +207,17 @@ class InvoiceSerializer(serializers.ModelSerializer):
             },
         }
 
+    @staticmethod
+    def referenced_requests(items):
+        """Requests referenced by a list of raw invoice payloads, by id"""
+        ids = {
+            int(item["request"])
+            for item in items
+            if isinstance(item, dict) and str(item.get("request")).isdigit()
+        }
+        return get_requests_by_ids(ids)
+
     def validate(self, attrs):
         """Function that set rule for not done requests Ex: If request still in working , it will raise Exception"""
-        if req_status_by_id(request_id=self.initial_data["request"]) == Request.Statuses.PROCESS:
-            raise serializers.ValidationError("This request is being developing")
-        else:
-            return attrs
+        check_request_done(attrs["request"].status)
+        return attrs
@@ -0,0 +1,91 @@
+"""Signal receivers of the service models"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from src import archive, billing, changes, jobs
+from src.authentication import forget_token_version, remember_token_version
+from src.cache import invalidate
+from src.models import Invoice, Request, User
+
+# Sent with ``instances`` and ``created`` after bulk_create/bulk_update and
+# conditional updates that bypass Model.save and its post_save signal.
+# Loaders of existing data pass ``enqueue_jobs=False`` to skip src.jobs.
+rows_written = Signal()
+
+
+def send_rows_written(sender, instances, created, enqueue_jobs=True):
+    rows_written.send(
+        sender=sender, instances=instances, created=created, enqueue_jobs=enqueue_jobs
+    )
+    for instance in instances:
+        instance.reset_loaded_values()
+
+
+@receiver(post_save, sender=User)
+def refresh_token_version(sender, instance, **kwargs):
+    remember_token_version(instance.pk, instance.token_version)
+
+
+@receiver(post_delete, sender=User)
+def drop_token_version(sender, instance, **kwargs):
+    forget_token_version(instance.pk)
+
+
+def request_customers(requests):
+    """Current and previous customers of ``requests``"""
+    customers = set()
+    for request in requests:
+        customers.add(request.customer_id)
+        loaded = getattr(request, "_loaded_values", None) or {}
+        customers.add(loaded.get("customer_id", request.customer_id))
+    return customers
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, raw=False, **kwargs):
+    invalidate(Invoice)
+    changes.record_changes(Invoice, [instance])
+    if not raw:
+        billing.record_invoice_writes([instance])
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_deleted(sender, instance, origin=None, **kwargs):
+    invalidate(Invoice)
+    changes.record_changes(Invoice, [instance], deleted=True)
+    # The customer's summary rows go away with the customer itself
+    if getattr(origin, "model", type(origin)) is not User:
+        billing.record_invoice_writes([instance], deleted=True)
+
+
+@receiver(post_save, sender=Request)
+def request_saved(sender, instance, created=False, raw=False, **kwargs):
+    invalidate(Request, request_customers([instance]))
+    changes.record_changes(Request, [instance])
+    if not raw:
+        billing.record_request_writes([instance])
+        if not created:
+            jobs.record_request_writes([instance])
+
+
+@receiver(post_delete, sender=Request)
+def request_deleted(sender, instance, **kwargs):
+    invalidate(Request, request_customers([instance]))
+    changes.record_changes(Request, [instance], deleted=True)
+    archive.delete_archived_invoices([instance.pk])
+
+
+@receiver(rows_written, sender=Invoice)
+def invoices_written(sender, instances, **kwargs):
+    invalidate(Invoice)
+    changes.record_changes(Invoice, instances)
+    billing.record_invoice_writes(instances)
+
+
+@receiver(rows_written, sender=Request)
+def requests_written(sender, instances, created, enqueue_jobs=True, **kwargs):
+    invalidate(Request, request_customers(instances))
+    changes.record_changes(Request, instances)
+    billing.record_request_writes(instances)
+    if enqueue_jobs and not created:
+        jobs.record_request_writes(instances)
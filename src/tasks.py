@@ -0,0 +1,37 @@
+"""Handlers of the background jobs, see src.jobs"""
+import logging
+
+from src.jobs import handler
+from src.models import Invoice, Request
+
+logger = logging.getLogger(__name__)
+
+
+@handler("create_invoice")
+def create_invoice(request, price=None):
+    """
+    Unpaid invoice at the price given when the request was finished. The
+    request row is locked while its invoices are checked, so a retried or
+    repeated job never issues a second one.
+    """
+    if price is None:
+        logger.warning("Request %s finished without an invoice price", request)
+        return
+    instance = (
+        Request.objects.select_for_update()
+        .filter(pk=request, status=Request.Statuses.DONE)
+        .first()
+    )
+    if instance is None or Invoice.objects.filter(request=instance).exists():
+        return
+    Invoice.objects.create(request=instance, price=price)
+
+
+@handler("notify_customer")
+def notify_customer(request):
+    """Tell the customer their request is done"""
+    instance = Request.objects.select_related("customer").filter(pk=request).first()
+    if instance is None:
+        return
+    # There is no SMS gateway yet, this is where it is called
+    logger.info("Request %s of %s is done", instance.pk, instance.customer.phone_number)
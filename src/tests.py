@@ -1,3 +1,1235 @@
-from django.test import TestCase
+"""Tests of the service endpoints and their database behaviour"""
+import base64
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.db.migrations.executor import MigrationExecutor
+from django.http import StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from src import jobs, routers
+from src.hashers import HashingPool, HashingPoolSaturated
+from src.admin import EstimatedCountPaginator
+from src.async_views import run_sync
+from src.benchmark import (
+    SCENARIOS,
+    Dataset,
+    InProcessRunner,
+    QueryCounter,
+    compare,
+    run_scenario,
+)
+from src.export import REQUEST_FIELDS, export_chunks
+from src.importer import Importer
+from src.listing import compile_serializer
+from src.management.commands.benchmark_admin import Command as BenchmarkAdmin
+from src.models import (
+    ArchivedInvoice,
+    ArchivedRequest,
+    Change,
+    Invoice,
+    Job,
+    Request,
+    User,
+)
+from src.schema import PrecomputedSchemaMixin
+from src.serializers import (
+    InvoiceSerializer,
+    MyTokenLoginSerializer,
+    RequestsSerializer,
+)
+from src.tokens import CachedRefreshToken
+from src.views import RequestsAPISet
+
+
+def client_for(user):
+    client = APIClient()
+    token = MyTokenLoginSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+class ServiceTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(
+            phone_number="+380991111111", password="secret"
+        )
+        self.client = client_for(self.customer)
+
+    def create_request(self, **fields):
+        fields = {
+            "customer": self.customer,
+            "phone_model": "pixel",
+            "problem_description": "screen does not turn on",
+            **fields,
+        }
+        return Request.objects.create(**fields)
+
+
+class RequestDoneJobsTests(ServiceTestCase):
+    def finish(self, request, **extra):
+        return self.client.put(
+            f"/service/cabinet/{request.pk}/",
+            {
+                "phone_model": request.phone_model,
+                "problem_description": request.problem_description,
+                "status": Request.Statuses.DONE,
+                **extra,
+            },
+            format="json",
+        )
+
+    @staticmethod
+    def run_jobs():
+        for job in jobs.claim(10):
+            jobs.run(job)
+
+    def tasks(self):
+        return sorted(Job.objects.values_list("task", flat=True))
+
+    def test_moving_to_done_enqueues_the_notice(self):
+        response = self.finish(self.create_request())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.tasks(), ["notify_customer"])
+
+    def test_invoice_is_issued_once_at_the_given_price(self):
+        request = self.create_request()
+        self.finish(request, invoice_price=120.5)
+        self.assertEqual(self.tasks(), ["create_invoice", "notify_customer"])
+        self.run_jobs()
+        Job.objects.filter(task="create_invoice").update(status=Job.Statuses.PENDING)
+        self.run_jobs()
+        self.assertEqual(
+            list(Invoice.objects.values_list("request_id", "price")),
+            [(request.pk, 120.5)],
+        )
+
+    def test_writes_without_a_transition_enqueue_nothing(self):
+        request = self.create_request(status=Request.Statuses.DONE)
+        self.finish(request, invoice_price=10)
+        request.refresh_from_db()
+        request.phone_model = "nokia"
+        request.save()
+        self.client.post(
+            "/service/cabinet/bulk/",
+            [{"phone_model": "x", "problem_description": "y", "status": "DONE"}],
+            format="json",
+        )
+        self.assertEqual(self.tasks(), [])
+
+    def test_imported_done_requests_enqueue_nothing(self):
+        lines = [
+            {"type": "request", "id": 500 + number, "customer": self.customer.pk}
+            | {"phone_model": "x", "problem_description": "y", "status": "DONE"}
+            for number in range(3)
+        ]
+        written, errors = Importer(use_copy=False).load_batch(
+            [(number, json.dumps(line)) for number, line in enumerate(lines)]
+        )
+        self.assertEqual((written, errors), (3, []))
+        self.assertEqual(self.tasks(), [])
+
+
+class ResponseCacheTests(ServiceTestCase):
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_writes_invalidate_cached_lists(self):
+        self.create_request()
+        self.assertEqual(self.client.get("/service/cabinet/")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/service/cabinet/")["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_request()
+        response = self.client.get("/service/cabinet/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 2)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_off_without_a_shared_cache(self):
+        self.create_request()
+        self.client.get("/service/cabinet/")
+        response = self.client.get("/service/cabinet/")
+        self.assertNotIn("X-Cache", response)
+
+
+class BulkRequestsTests(ServiceTestCase):
+    def queries(self, method, items):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                "/service/cabinet/bulk/", items, format="json"
+            )
+        self.assertLess(response.status_code, 300, response.data)
+        return len(queries)
+
+    def items(self, count, **fields):
+        return [
+            {"phone_model": "pixel", "problem_description": f"no. {number}", **fields}
+            for number in range(count)
+        ]
+
+    def test_create_queries_do_not_grow_with_items(self):
+        self.assertEqual(
+            self.queries("post", self.items(2, customer=self.customer.pk)),
+            self.queries("post", self.items(20, customer=self.customer.pk)),
+        )
+        self.assertEqual(
+            self.queries("post", self.items(2)), self.queries("post", self.items(20))
+        )
+
+    def test_update_queries_do_not_grow_with_items(self):
+        ids = [self.create_request().pk for _ in range(20)]
+        few = [{"id": pk, **item} for pk, item in zip(ids, self.items(2))]
+        many = [{"id": pk, **item} for pk, item in zip(ids, self.items(20))]
+        self.assertEqual(self.queries("put", few), self.queries("put", many))
+
+
+class BillingSummaryMigrationTests(TransactionTestCase):
+    before = [("src", "0004_user_token_version")]
+    after = [("src", "0005_billing_summary")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_invoices_are_summarised(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model("src", "User")
+        Request = apps.get_model("src", "Request")
+        Invoice = apps.get_model("src", "Invoice")
+        customer = User.objects.create(phone_number="+380991111111", password="!")
+        request = Request.objects.create(
+            customer=customer, phone_model="x", problem_description="y", status="DONE"
+        )
+        for price, status in ((10, "PAID"), (5.5, "PAID"), (7, "UNPAID")):
+            Invoice.objects.create(request=request, price=price, status=status)
+
+        apps = self.migrate(self.after)
+        summary = apps.get_model("src", "BillingSummary").objects.values_list(
+            "customer_id", "status", "invoice_count", "total"
+        )
+        self.assertEqual(
+            sorted(summary),
+            [(customer.pk, "PAID", 2, 15.5), (customer.pk, "UNPAID", 1, 7.0)],
+        )
+
+
+class HashingPoolTests(TestCase):
+    @override_settings(HASHING_POOL_SIZE=1, HASHING_QUEUE_LIMIT=1)
+    def test_calls_past_the_queue_limit_are_rejected(self):
+        pool, release = HashingPool(), threading.Event()
+        waiting = [
+            threading.Thread(target=pool.run, args=(release.wait, 5)) for _ in "ab"
+        ]
+        for thread in waiting:
+            thread.start()
+        try:
+            while pool.in_flight < 2:
+                release.wait(0.01)
+            with self.assertRaises(HashingPoolSaturated):
+                pool.run(str, "rejected")
+        finally:
+            release.set()
+            for thread in waiting:
+                thread.join()
+        self.assertEqual(pool.run(str, "accepted"), "accepted")
+        self.assertEqual(pool.in_flight, 0)
+
+    @override_settings(HASHING_POOL_SIZE=2, HASHING_QUEUE_LIMIT=0)
+    def test_sequential_calls_are_never_rejected(self):
+        pool = HashingPool()
+        for number in range(10):
+            self.assertEqual(pool.run(str, number), str(number))
+
+
+class QueryPlanTests(TestCase):
+    def index_names(self, model):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        return {name for name, info in constraints.items() if info["index"]}
+
+    def test_hot_filter_indexes_exist(self):
+        self.assertLessEqual(
+            {
+                "src_request_cust_id_idx",
+                "src_request_cust_status_idx",
+                "src_request_phone_idx",
+                "src_request_status_idx",
+            },
+            self.index_names(Request),
+        )
+        self.assertLessEqual(
+            {"src_invoice_req_status_idx", "src_invoice_status_idx"},
+            self.index_names(Invoice),
+        )
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "plans of PostgreSQL")
+    def test_hot_queries_use_an_index(self):
+        # Statistics of near empty tables make any plan look as cheap. As in
+        # production, most rows are finished and each customer has a few.
+        customers = User.objects.bulk_create(
+            User(phone_number=f"+38099{number:07}") for number in range(200)
+        )
+        done, paid = Request.Statuses.DONE, Invoice.Statuses.PAID
+        requests = Request.objects.bulk_create(
+            Request(
+                customer=customers[number % 200],
+                phone_model=f"model {number % 50}",
+                problem_description="x",
+                status=done if number % 10 else Request.Statuses.PROCESS,
+            )
+            for number in range(1000)
+        )
+        Invoice.objects.bulk_create(
+            Invoice(
+                request=request,
+                price=1,
+                status=paid if number % 10 else Invoice.Statuses.UNPAID,
+            )
+            for number, request in enumerate(requests)
+        )
+        with connection.cursor() as cursor:
+            for model in (User, Request, Invoice):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertNotIn("FULL SCAN", out.getvalue())
+
+
+class InvoiceQueriesTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(
+            User.objects.create_superuser(
+                phone_number="+380992222222", password="secret"
+            )
+        )
+        self.request = self.create_request(status=Request.Statuses.DONE)
+
+    def item(self, **fields):
+        return {"request": self.request.pk, "price": 5, **fields}
+
+    def test_create(self):
+        with self.assertNumQueries(10):
+            response = self.client.post("/service/billing/", self.item(), format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_update(self):
+        invoice = Invoice.objects.create(request=self.request, price=1)
+        with self.assertNumQueries(13):
+            response = self.client.put(
+                f"/service/billing/{invoice.pk}/", self.item(price=6), format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_create(self):
+        for count in (2, 20):
+            with self.assertNumQueries(10):
+                response = self.client.post(
+                    "/service/billing/bulk/", [self.item()] * count, format="json"
+                )
+            self.assertEqual(response.status_code, 201)
+
+    def test_bulk_update(self):
+        invoices = Invoice.objects.bulk_create(
+            Invoice(request=self.request, price=1) for _ in range(22)
+        )
+        for batch in (invoices[:2], invoices[2:]):
+            items = [
+                self.item(id=invoice.pk, version=invoice.version, price=6)
+                for invoice in batch
+            ]
+            with self.assertNumQueries(11):
+                response = self.client.put(
+                    "/service/billing/bulk/", items, format="json"
+                )
+            self.assertEqual(response.status_code, 200, response.data)
+
+    def test_requests_in_process_get_no_invoice(self):
+        in_process = self.create_request()
+        response = self.client.post(
+            "/service/billing/", self.item(request=in_process.pk), format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/service/billing/bulk/",
+            [self.item(), self.item(request=in_process.pk)],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+
+@override_settings(REPLICA_DATABASES=["replica"], RESPONSE_CACHE_ENABLED=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(
+            phone_number="+380991111111", password="secret"
+        )
+        self.client = client_for(self.customer)
+
+    def request_reads(self, method, path, data=None, client=None):
+        """Aliases that read requests while serving one API call"""
+        aliases = set()
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = getattr(client or self.client, method)(
+                    path, data, format="json"
+                )
+        self.assertLess(response.status_code, 300)
+        for alias, queries in (("default", primary), ("replica", replica)):
+            if any(
+                query["sql"].startswith("SELECT") and '"src_request"' in query["sql"]
+                for query in queries
+            ):
+                aliases.add(alias)
+        return aliases
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertEqual(self.request_reads("get", "/service/cabinet/"), {"replica"})
+
+    def test_a_write_pins_the_writer_to_the_primary(self):
+        other = client_for(
+            User.objects.create_user(phone_number="+380992222222", password="secret")
+        )
+        self.client.post(
+            "/service/cabinet/",
+            {"phone_model": "pixel", "problem_description": "no sound"},
+            format="json",
+        )
+        self.assertEqual(self.request_reads("get", "/service/cabinet/"), {"default"})
+        self.assertEqual(
+            self.request_reads("get", "/service/cabinet/", client=other), {"replica"}
+        )
+        cache.delete(routers.sticky_key(self.customer.pk))
+        self.assertEqual(self.request_reads("get", "/service/cabinet/"), {"replica"})
+
+    def test_use_primary_overrides_the_replica(self):
+        router = routers.PrimaryReplicaRouter()
+        token = routers.current.set(
+            routers.RoutingState(RequestFactory().get("/service/cabinet/"))
+        )
+        try:
+            self.assertEqual(router.db_for_read(Request), "replica")
+            with routers.use_primary():
+                self.assertEqual(router.db_for_read(Request), "default")
+            self.assertEqual(router.db_for_read(Request), "replica")
+        finally:
+            routers.current.reset(token)
+
+
+class OptimisticConcurrencyTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = self.create_request(status=Request.Statuses.DONE)
+        self.path = f"/service/cabinet/{self.request.pk}/"
+        self.data = {"phone_model": "nokia", "problem_description": "no sound"}
+
+    def version(self):
+        return Request.objects.values_list("version", flat=True).get()
+
+    def changed_by_another_request(self):
+        """Bump the row version right after the view loaded the row"""
+        get_object = RequestsAPISet.get_object
+
+        def load_then_change(view):
+            instance = get_object(view)
+            Request.objects.filter(pk=instance.pk).update(version=F("version") + 1)
+            return instance
+
+        return mock.patch.object(RequestsAPISet, "get_object", load_then_change)
+
+    def test_stale_if_match_fails_the_precondition(self):
+        stale = {"HTTP_IF_MATCH": '"0"'}
+        response = self.client.put(self.path, self.data, format="json", **stale)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.client.delete(self.path, **stale).status_code, 412)
+        self.assertEqual(self.version(), 1)
+        self.assertTrue(Request.objects.exists())
+
+    def test_concurrent_write_conflicts(self):
+        with self.changed_by_another_request():
+            response = self.client.put(self.path, self.data, format="json")
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(self.client.delete(self.path).status_code, 409)
+        self.assertEqual(self.version(), 3)
+        self.assertEqual(Request.objects.get().phone_model, "pixel")
+
+    def test_bulk_update_rejects_a_stale_version(self):
+        response = self.client.put(
+            "/service/cabinet/bulk/",
+            [{"id": self.request.pk, "version": 0, **self.data}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Changed since version 0", str(response.data))
+        self.assertEqual(self.version(), 1)
+
+    def test_every_write_bumps_the_version_once(self):
+        response = self.client.put(
+            self.path, self.data, format="json", HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual((response.status_code, response["ETag"]), (200, '"2"'))
+        self.assertEqual(self.version(), 2)
+        response = self.client.put(
+            "/service/cabinet/bulk/",
+            [{"id": self.request.pk, "version": 2, **self.data}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.version(), 3)
+        self.request.refresh_from_db()
+        self.request.save()
+        self.assertEqual(self.version(), 4)
+
+
+class AdminChangelistTests(TestCase):
+    pages = [
+        "/admin/src/user/",
+        "/admin/src/request/",
+        "/admin/src/request/?p=3",
+        "/admin/src/request/?status__exact=DONE",
+        "/admin/src/invoice/",
+        "/admin/src/invoice/?status__exact=PAID",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        BenchmarkAdmin.seed(customers=20, requests=60, invoices=40)
+        cls.admin = User.objects.create_superuser(
+            phone_number="+389999999999", password="secret"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages_run_a_fixed_number_of_queries(self):
+        # Session, user, count and the page with its related rows joined
+        for path in self.pages:
+            with self.subTest(path), self.assertNumQueries(4):
+                self.assertEqual(self.client.get(path).status_code, 200)
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "estimates of PostgreSQL")
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=10)
+    def test_counts_past_the_limit_are_estimated(self):
+        for path in self.pages:
+            with self.subTest(path), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(path).status_code, 200)
+            self.assertEqual(len(queries), 5)
+            self.assertTrue(queries[-2]["sql"].startswith("EXPLAIN"))
+            self.assertFalse(
+                any(query["sql"].startswith("SELECT COUNT(*) AS") for query in queries)
+            )
+        with self.assertNumQueries(2):
+            self.assertGreater(
+                EstimatedCountPaginator(Request.objects.order_by("-id"), 10).count, 10
+            )
+
+
+class KeysetPaginationTests(ServiceTestCase):
+    def cursor(self, position):
+        return base64.urlsafe_b64encode(position.encode("ascii")).decode("ascii")
+
+    def test_invalid_cursors_are_not_found(self):
+        for position in ('{"k": Infinity}', '{"k": NaN}', '{"k": "x"}', "[]", "{"):
+            with self.subTest(position):
+                response = self.client.get(
+                    f"/service/cabinet/?cursor={self.cursor(position)}"
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_pages_walk_every_row_once(self):
+        ids = [self.create_request().pk for _ in range(25)]
+        seen, path = [], "/service/cabinet/?pagination=keyset"
+        while path:
+            response = self.client.get(path)
+            seen += [row["id"] for row in response.data["results"]]
+            path = response.data["next"]
+        self.assertEqual(seen, ids[::-1])
+
+
+class MetricsTests(ServiceTestCase):
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_not_served_without_a_token_in_production(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="scrape")
+    def test_requires_the_token(self):
+        self.client.get("/service/cabinet/")
+        scraper = APIClient()
+        self.assertEqual(scraper.get("/metrics").status_code, 401)
+        response = scraper.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'service_request_queries_count{view="RequestsAPISet.list"}',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN="scrape")
+    def test_one_scrape_sums_every_worker(self):
+        observe = (
+            "import django; django.setup(); "
+            "from src.instrumentation import request_queries; "
+            "request_queries.labels('Worker.list').observe(3)"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                "PROMETHEUS_MULTIPROC_DIR": directory,
+                "PYTHONPATH": os.pathsep.join(
+                    filter(None, [str(settings.BASE_DIR), *sys.path])
+                ),
+            }
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", observe], env=env, check=True)
+            with mock.patch.dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory):
+                response = APIClient().get(
+                    "/metrics", HTTP_AUTHORIZATION="Bearer scrape"
+                )
+        self.assertIn(
+            'service_request_queries_count{view="Worker.list"} 2.0',
+            response.content.decode(),
+        )
+
+    def test_job_metrics_are_cached_between_scrapes(self):
+        with self.assertNumQueries(3):
+            first = jobs.expose_metrics()
+        with self.assertNumQueries(0):
+            self.assertEqual(jobs.expose_metrics(), first)
+
+
+class AsyncViewsTests(ServiceTestCase):
+    def test_sync_code_runs_once_off_the_event_loop(self):
+        calls = []
+
+        def count_requests():
+            calls.append(threading.current_thread())
+            return Request.objects.count()
+
+        self.create_request()
+        self.assertEqual(async_to_sync(run_sync)(count_requests), 1)
+        self.assertEqual(calls, [threading.current_thread()])
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_async_reads_match_the_sync_views(self):
+        request = self.create_request()
+        for path in ("/service/cabinet/", f"/service/cabinet/{request.pk}/"):
+            with self.subTest(path):
+                expected = self.client.get(path).data
+                for cache_status in ("MISS", "HIT"):
+                    response = self.client.get(
+                        path.replace("/service/", "/service/async/")
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response["X-Cache"], cache_status)
+                    self.assertEqual(response.json(), json.loads(json.dumps(expected)))
+
+
+class ClaimsAuthenticationTests(ServiceTestCase):
+    def test_valid_token_does_not_query_the_user(self):
+        self.client.get("/service/cabinet/")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get("/service/cabinet/").status_code, 200)
+        self.assertFalse(any('"src_user"' in query["sql"] for query in queries))
+
+    def test_role_change_rejects_the_issued_token(self):
+        self.client.get("/service/cabinet/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.role = User.Roles.MASTER
+            self.customer.save()
+        self.assertEqual(self.client.get("/service/cabinet/").status_code, 401)
+        self.assertEqual(
+            client_for(self.customer).get("/service/cabinet/").status_code, 200
+        )
+
+    def test_queryset_updates_reject_the_issued_token(self):
+        for update in ({"role": User.Roles.MASTER}, {"is_active": False}):
+            with self.subTest(update):
+                client = client_for(User.objects.get(pk=self.customer.pk))
+                self.assertEqual(client.get("/service/cabinet/").status_code, 200)
+                with self.captureOnCommitCallbacks(execute=True):
+                    User.objects.filter(pk=self.customer.pk).update(**update)
+                self.assertEqual(client.get("/service/cabinet/").status_code, 401)
+
+    def test_bulk_update_rejects_the_issued_token(self):
+        self.client.get("/service/cabinet/")
+        self.customer.is_staff = True
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.bulk_update([self.customer], ["is_staff"])
+        self.assertEqual(self.client.get("/service/cabinet/").status_code, 401)
+
+    def test_inactive_user_is_rejected(self):
+        self.customer.is_active = False
+        self.customer.save()
+        response = client_for(self.customer).get("/service/cabinet/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "user_inactive")
+
+
+class ImportJsonlTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "dump.jsonl")
+
+    def write(self, *rows):
+        with open(self.path, "w") as dump:
+            for row in rows:
+                dump.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+
+    def load(self, *options):
+        out, err = StringIO(), StringIO()
+        call_command("import_jsonl", self.path, *options, stdout=out, stderr=err)
+        return err.getvalue()
+
+    def user(self, pk):
+        return {"type": "user", "id": pk, "phone_number": f"+38099{pk:07d}"} | {
+            "password": "secret"
+        }
+
+    def request(self, pk, customer, status="DONE"):
+        return {"type": "request", "id": pk, "customer": customer, "status": status} | {
+            "phone_model": "x",
+            "problem_description": "y",
+        }
+
+    def test_resumes_after_the_checkpoint(self):
+        self.write(self.user(1000), self.user(1001), self.request(2000, 1001))
+        with open(f"{self.path}.checkpoint", "w") as checkpoint:
+            checkpoint.write("1")
+        self.load("--batch-size", "1")
+        self.assertFalse(User.objects.filter(pk=1000).exists())
+        self.assertTrue(Request.objects.filter(pk=2000, customer_id=1001).exists())
+        with open(f"{self.path}.checkpoint") as checkpoint:
+            self.assertEqual(checkpoint.read(), "3")
+
+    def test_invalid_rows_are_rejected(self):
+        self.write(
+            self.user(1000),
+            "not json",
+            self.user(1000),
+            self.request(2000, 999),
+            self.request(2001, 1000, status="PROCESS"),
+            {"type": "invoice", "id": 3000, "request": 2001, "price": 5},
+            {"type": "invoice", "id": 3001, "request": 2000, "price": 5},
+        )
+        errors = self.load()
+        for line in (2, 3, 4, 6, 7):
+            self.assertIn(f"line {line}:", errors)
+        self.assertEqual(list(Request.objects.values_list("pk", flat=True)), [2001])
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_strict_mode_writes_nothing_of_a_bad_batch(self):
+        self.write(self.user(1000), self.request(2000, 999))
+        with self.assertRaises(CommandError):
+            self.load("--strict")
+        self.assertFalse(User.objects.filter(pk=1000).exists())
+
+    def test_new_rows_follow_the_ids_of_each_committed_batch(self):
+        # As a run interrupted after its first batch leaves the database
+        Importer().load_batch(
+            [
+                (1, json.dumps(self.user(1000))),
+                (2, json.dumps(self.request(2000, 1000))),
+            ]
+        )
+        self.assertGreater(self.create_request().pk, 2000)
+        self.assertGreater(
+            User.objects.create_user(phone_number="+380993333333", password="x").pk,
+            1000,
+        )
+
+
+class SyncTests(ServiceTestCase):
+    def sync(self, since=None, **headers):
+        params = {"since": since} if since else {}
+        return self.client.get("/service/sync/", params, **headers)
+
+    def synced_ids(self, response):
+        return [row["id"] for row in response.data["requests"]]
+
+    def test_a_token_returns_only_later_changes(self):
+        first, second = self.create_request(), self.create_request()
+        response = self.sync()
+        self.assertEqual(self.synced_ids(response), [first.pk, second.pk])
+        self.assertEqual(response.data["deleted"], {"requests": [], "invoices": []})
+
+        third = self.create_request()
+        first.phone_model = "nokia"
+        first.save()
+        response = self.sync(response.data["next"])
+        self.assertEqual(self.synced_ids(response), [first.pk, third.pk])
+        self.assertEqual(response.data["requests"][0]["phone_model"], "nokia")
+        self.assertEqual(self.synced_ids(self.sync(response.data["next"])), [])
+
+    def test_deleted_and_moved_requests_leave_tombstones(self):
+        deleted, moved = self.create_request(), self.create_request()
+        token = self.sync().data["next"]
+        deleted_pk = deleted.pk
+        deleted.delete()
+        other = User.objects.create_user(phone_number="+380992222222", password="x")
+        moved = Request.objects.get(pk=moved.pk)
+        moved.customer = other
+        moved.save()
+
+        response = self.sync(token)
+        self.assertEqual(self.synced_ids(response), [])
+        self.assertEqual(response.data["deleted"]["requests"], [deleted_pk, moved.pk])
+        response = client_for(other).get("/service/sync/")
+        self.assertEqual(self.synced_ids(response), [moved.pk])
+
+    def test_expired_token_is_gone(self):
+        issued = time.time() - (settings.SYNC_TOMBSTONE_DAYS + 1) * 86400
+        token = base64.urlsafe_b64encode(
+            json.dumps({"x": 0, "c": 0, "t": int(issued)}).encode()
+        ).decode()
+        self.assertEqual(self.sync(token).status_code, 410)
+        self.assertEqual(self.sync("not a token").status_code, 400)
+
+    def test_idle_poll_is_not_modified(self):
+        self.create_request()
+        token = self.sync().data["next"]
+        response = self.sync(token)
+        self.assertEqual(
+            self.sync(token, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304
+        )
+        self.create_request()
+        response = self.sync(token, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["requests"]), 1)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "transaction ids")
+class SyncVisibilityTests(TransactionTestCase):
+    def test_a_late_commit_is_not_skipped(self):
+        customer = User.objects.create_user(
+            phone_number="+380991111111", password="secret"
+        )
+        client = client_for(customer)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    Request.objects.create(
+                        customer=customer, phone_model="slow", problem_description="x"
+                    )
+                    started.set()
+                    release.wait(10)
+            finally:
+                connections.close_all()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        started.wait(10)
+        Request.objects.create(
+            customer=customer, phone_model="fast", problem_description="x"
+        )
+        # The slow writer's change id is lower, its transaction is still open
+        first = client.get("/service/sync/").data
+        release.set()
+        writer.join()
+        second = client.get("/service/sync/", {"since": first["next"]}).data
+        synced = first["requests"] + second["requests"]
+        self.assertEqual(sorted(row["phone_model"] for row in synced), ["fast", "slow"])
+
+
+class ArchiveTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.done = self.create_request(status=Request.Statuses.DONE)
+        self.invoice = Invoice.objects.create(
+            request=self.done, price=40, status=Invoice.Statuses.PAID
+        )
+        self.open = self.create_request()
+        self.other = User.objects.create_user(
+            phone_number="+380992222222", password="x"
+        )
+        self.other_done = self.create_request(
+            customer=self.other, status=Request.Statuses.DONE
+        )
+        call_command("archive_data", "--days", "0", stdout=StringIO())
+
+    def ids(self, path):
+        return [row["id"] for row in self.client.get(path).data["results"]]
+
+    def test_finished_rows_move_to_the_archive(self):
+        self.assertEqual(
+            list(Request.objects.values_list("pk", flat=True)), [self.open.pk]
+        )
+        self.assertFalse(Invoice.objects.exists())
+        self.assertEqual(
+            sorted(ArchivedRequest.objects.values_list("pk", flat=True)),
+            [self.done.pk, self.other_done.pk],
+        )
+        self.assertEqual(
+            list(ArchivedInvoice.objects.values_list("pk", "customer_id")),
+            [(self.invoice.pk, self.customer.pk)],
+        )
+        # Archived rows stay billed and are not deleted for syncing clients
+        summary = self.client.get("/service/billing/summary/").data
+        self.assertEqual((summary["count"], summary["total"]), (1, 40))
+        self.assertFalse(Change.objects.filter(deleted=True).exists())
+
+    def test_lists_include_own_archived_rows_on_request(self):
+        self.assertEqual(self.ids("/service/cabinet/"), [self.open.pk])
+        self.assertEqual(
+            self.ids("/service/cabinet/?include_archived=true"),
+            [self.open.pk, self.done.pk],
+        )
+
+    def test_archived_rows_are_retrieved_for_their_customer_only(self):
+        path = f"/service/cabinet/{self.done.pk}/"
+        self.assertEqual(self.client.get(path).status_code, 404)
+        response = self.client.get(f"{path}?include_archived=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data["id"], response.data["status"]),
+            (self.done.pk, Request.Statuses.DONE),
+        )
+        response = self.client.get(
+            f"/service/cabinet/{self.other_done.pk}/?include_archived=true"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff_reads_archived_invoices(self):
+        staff = User.objects.create_user(
+            phone_number="+380993333333", password="x", is_staff=True
+        )
+        response = client_for(staff).get("/service/billing/?include_archived=true")
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]], [self.invoice.pk]
+        )
+        self.assertEqual(response.data["results"][0]["price"], 40)
+
+
+class FacetsTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        for phone_model, status in (
+            ("pixel", "DONE"),
+            ("pixel", "PROCESS"),
+            ("nokia", "DONE"),
+            ("nokia", "DONE"),
+        ):
+            self.create_request(phone_model=phone_model, status=status)
+        other = User.objects.create_user(phone_number="+380992222222", password="x")
+        self.create_request(customer=other, phone_model="iphone")
+
+    def facets(self, query=""):
+        response = self.client.get(f"/service/cabinet/facets/{query}")
+        counts = {
+            field: {item["value"]: item["count"] for item in items}
+            for field, items in response.data["facets"].items()
+        }
+        return response.data["count"], counts
+
+    def test_a_facet_ignores_its_own_filter(self):
+        count, facets = self.facets("?status=DONE")
+        self.assertEqual(count, 3)
+        self.assertEqual(facets["status"], {"DONE": 3, "PROCESS": 1})
+        self.assertEqual(facets["phone_model"], {"nokia": 2, "pixel": 1})
+
+    def test_counts_match_the_list(self):
+        for query in ("", "?phone_model=pixel", "?status=DONE&phone_model=nokia"):
+            with self.subTest(query):
+                count, _ = self.facets(query)
+                self.assertEqual(
+                    count, self.client.get(f"/service/cabinet/{query}").data["count"]
+                )
+
+    def test_archived_rows_count_when_listed(self):
+        call_command("archive_data", "--days", "0", stdout=StringIO())
+        count, facets = self.facets("?include_archived=true")
+        listed = self.client.get("/service/cabinet/?include_archived=true")
+        self.assertEqual(count, listed.data["count"])
+        self.assertEqual(count, 4)
+        self.assertEqual(facets["status"], {"DONE": 3, "PROCESS": 1})
+        self.assertEqual(self.facets()[0], 1)
+
+
+class SearchTests(ServiceTestCase):
+    def ids(self, path):
+        return [row["id"] for row in self.client.get(path).data["results"]]
+
+    def test_search_walks_matching_rows_with_keyset_pages(self):
+        matching = []
+        for number in range(12):
+            description = "screen cracked" if number % 2 else "battery drains"
+            request = self.create_request(problem_description=description)
+            if number % 2:
+                matching.append(request.pk)
+        seen, path = [], "/service/cabinet/?pagination=keyset&page_size=4&search=screen"
+        while path:
+            response = self.client.get(path)
+            seen += [row["id"] for row in response.data["results"]]
+            path = response.data["next"]
+        self.assertEqual(seen, matching[::-1])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "full text search")
+    def test_trigger_indexes_descriptions_for_ranked_search(self):
+        once = self.create_request(problem_description="screen cracked")
+        twice = self.create_request(
+            problem_description="broken screen, screen flickers"
+        )
+        other = self.create_request(problem_description="battery drains")
+        self.assertEqual(
+            self.ids("/service/cabinet/?search=screens"), [twice.pk, once.pk]
+        )
+        other.problem_description = "cracked screens"
+        other.save()
+        self.assertEqual(
+            set(self.ids("/service/cabinet/?search=screen")),
+            {once.pk, twice.pk, other.pk},
+        )
+        self.assertEqual(
+            self.ids("/service/cabinet/?search=screen -cracked"), [twice.pk]
+        )
+
+
+class ExportTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_request(problem_description='cracked, "badly"')
+        self.second = self.create_request(status=Request.Statuses.DONE)
+        other = User.objects.create_user(phone_number="+380992222222", password="x")
+        self.create_request(customer=other)
+
+    def export(self, client, path):
+        response = client.get(path)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_streams_the_callers_rows(self):
+        response, content = self.export(self.client, "/service/cabinet/export/csv/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="title.csv"', response["Content-Disposition"])
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(
+            rows,
+            [
+                ["id", "status", "phone_model", "problem_description", "customer"],
+                [str(self.first.pk), "PROCESS", "pixel", 'cracked, "badly"']
+                + [str(self.customer.pk)],
+                [str(self.second.pk), "DONE", "pixel", "screen does not turn on"]
+                + [str(self.customer.pk)],
+            ],
+        )
+
+    def test_jsonl_applies_the_list_filters(self):
+        response, content = self.export(
+            self.client, "/service/cabinet/export/jsonl/?status=DONE"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            [json.loads(line) for line in content.splitlines()],
+            [
+                {
+                    "id": self.second.pk,
+                    "status": "DONE",
+                    "phone_model": "pixel",
+                    "problem_description": "screen does not turn on",
+                    "customer": self.customer.pk,
+                }
+            ],
+        )
+
+    def test_masters_export_every_customer(self):
+        master = User.objects.create_user(
+            phone_number="+380993333333", password="x", role=User.Roles.MASTER
+        )
+        _, content = self.export(client_for(master), "/service/cabinet/export/jsonl/")
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_rows_are_sent_in_chunks(self):
+        chunks = list(
+            export_chunks(Request.objects.all(), REQUEST_FIELDS, "jsonl", chunk_size=2)
+        )
+        self.assertEqual([chunk.count("\n") for chunk in chunks], [2, 1])
+
+
+class RefreshTokenTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.refresh = str(MyTokenLoginSerializer.get_token(self.customer))
+
+    def logout(self):
+        return self.client.post(
+            "/service/logout/", {"refresh": self.refresh}, format="json"
+        )
+
+    def test_blacklist_lookups_are_cached(self):
+        with self.assertNumQueries(1):
+            CachedRefreshToken(self.refresh)
+        with self.assertNumQueries(0):
+            CachedRefreshToken(self.refresh)
+
+    def test_blacklisting_replaces_the_cached_answer(self):
+        CachedRefreshToken(self.refresh)
+        self.assertEqual(self.logout().status_code, 201)
+        with self.assertNumQueries(0), self.assertRaises(TokenError):
+            CachedRefreshToken(self.refresh)
+        self.assertEqual(self.logout().status_code, 400)
+
+    def test_prune_removes_expired_tokens_only(self):
+        expired = [
+            CachedRefreshToken.for_user(self.customer).payload["jti"] for _ in range(3)
+        ]
+        CachedRefreshToken(self.refresh).blacklist()
+        tokens = OutstandingToken.objects.filter(jti__in=expired)
+        tokens.update(expires_at=timezone.now() - timedelta(seconds=1))
+        BlacklistedToken.objects.create(token=tokens.first())
+
+        out = StringIO()
+        call_command("prune_tokens", "--batch-size", "2", stdout=out)
+        self.assertIn("Deleted 3 expired tokens", out.getvalue())
+        self.assertFalse(OutstandingToken.objects.filter(jti__in=expired).exists())
+        self.assertTrue(
+            BlacklistedToken.objects.filter(
+                token__jti=CachedRefreshToken(self.refresh, verify=False)["jti"]
+            ).exists()
+        )
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class SchemaTests(TestCase):
+    def setUp(self):
+        PrecomputedSchemaMixin.documents.clear()
+        self.addCleanup(PrecomputedSchemaMixin.documents.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_file = os.path.join(directory.name, "openapi.json")
+
+    def generate(self):
+        call_command("generate_schema", "--output", self.schema_file, stdout=StringIO())
+        with open(self.schema_file, "rb") as file:
+            return file.read()
+
+    def test_written_document_is_served_with_an_etag(self):
+        document = json.loads(self.generate())
+        document["info"]["x-written-by"] = "deploy"
+        written = json.dumps(document).encode()
+        with open(self.schema_file, "wb") as file:
+            file.write(written)
+        with override_settings(OPENAPI_SCHEMA_FILE=self.schema_file):
+            response = self.client.get("/", {"format": "openapi"})
+            self.assertEqual(response.content, written)
+            not_modified = self.client.get(
+                "/", {"format": "openapi"}, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_document_generated_on_first_hit_matches_the_command(self):
+        with override_settings(OPENAPI_SCHEMA_FILE=self.schema_file):
+            served = self.client.get("/", {"format": "openapi"}).content
+        self.assertEqual(json.loads(served), json.loads(self.generate()))
+        self.assertIn("/sync/", json.loads(served)["paths"])
+
+
+class ListRenderingTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(3):
+            request = self.create_request(
+                phone_model=f"model {number}",
+                problem_description=f"Screen «{number}» does not turn on",
+                status=Request.Statuses.DONE if number else Request.Statuses.PROCESS,
+            )
+            Invoice.objects.create(request=request, price=number * 1.5)
+
+    def test_values_rendering_matches_the_serializer(self):
+        renderer = JSONRenderer()
+        for serializer_class, model in (
+            (RequestsSerializer, Request),
+            (InvoiceSerializer, Invoice),
+        ):
+            with self.subTest(serializer_class.__name__):
+                compiled = compile_serializer(serializer_class)
+                self.assertIsNotNone(compiled)
+                queryset = model.objects.order_by("-id")
+                self.assertEqual(
+                    renderer.render(
+                        compiled.render(queryset.values(*compiled.columns))
+                    ),
+                    renderer.render(serializer_class(queryset, many=True).data),
+                )
+
+    def test_list_pages_match_the_serializer(self):
+        # The page order is the database's, compare by id
+        results = self.client.get("/service/cabinet/").json()["results"]
+        self.assertEqual(
+            sorted(results, key=lambda row: row["id"]),
+            json.loads(
+                JSONRenderer().render(
+                    RequestsSerializer(Request.objects.order_by("id"), many=True).data
+                )
+            ),
+        )
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class BenchmarkTests(TestCase):
+    def test_every_scenario_runs_without_errors(self):
+        dataset = Dataset(customers=3, requests=12, invoices=6)
+        counter = QueryCounter()
+        counter.install(connection)
+        self.addCleanup(connection.execute_wrappers.remove, counter)
+        with InProcessRunner() as runner:
+            for scenario in SCENARIOS:
+                with self.subTest(scenario.name):
+                    result = run_scenario(runner, scenario, dataset, 2, counter)
+                    self.assertEqual(result["errors"], 0)
+                    self.assertEqual(result["requests"], 2)
+
+    def test_regressions_against_a_baseline(self):
+        baseline = {
+            "in-process/list": {
+                "queries": 3.0,
+                "p95": 10.0,
+                "throughput": 100.0,
+                "errors": 0,
+            }
+        }
+        current = {"in-process/list": {**baseline["in-process/list"], "p95": 11.0}}
+        self.assertEqual(compare(current, baseline, tolerance=0.2), [])
+        current["in-process/list"].update(queries=4.0, p95=13.0, errors=1)
+        self.assertEqual(len(compare(current, baseline, tolerance=0.2)), 3)
@@ -0,0 +1,42 @@
+"""Refresh tokens with a cache in front of the blacklist tables"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def blacklist_key(jti):
+    return f"auth:blacklisted:{jti}"
+
+
+class CachedRefreshToken(RefreshToken):
+    """
+    Blacklist membership is cached per JTI until the token expires, so repeated
+    checks skip the ``BlacklistedToken`` join. Tokens found not to be blacklisted
+    are remembered for ``TOKEN_BLACKLIST_NEGATIVE_TTL`` seconds only; blacklisting
+    through this class overwrites that entry right away.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        blacklisted = cache.get(blacklist_key(jti))
+        if blacklisted is None:
+            blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+            self.remember(jti, blacklisted)
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        self.remember(self.payload[api_settings.JTI_CLAIM], True)
+        return result
+
+    def remember(self, jti, blacklisted):
+        seconds_left = int(self.payload["exp"] - self.current_time.timestamp())
+        if not blacklisted:
+            seconds_left = min(seconds_left, settings.TOKEN_BLACKLIST_NEGATIVE_TTL)
+        if seconds_left > 0:
+            cache.set(blacklist_key(jti), blacklisted, seconds_left)
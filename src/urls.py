@@ -1,4 +1,5 @@
 """Router for endpoints"""
+from django.conf import settings
 from django.urls import path, include
 from src import views
 from rest_framework.routers import DefaultRouter
@@ -11,5 +12,9 @@ urlpatterns = [
     path("registration/", views.RegistrationView.as_view(), name="registration"),
     path("login/", views.MyTokenLoginView.as_view(), name="login"),
     path("logout/", views.MyTokenLogoutView.as_view(), name="logout"),
-    path("", include(router.urls)),
+    path("sync/", views.SyncView.as_view(), name="sync"),
+    path("cache-stats/", views.ResponseCacheStatsView.as_view(), name="cache-stats"),
 ]
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns.append(path("", include("src.async_urls")))
+urlpatterns.append(path("", include(router.urls)))
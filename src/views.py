@@ -3,52 +3,185 @@ import logging
 from src.serializers import (
     RegistrationSerializer,
     RequestsSerializer,
+    MyTokenLoginSerializer,
     MyTokenLogoutSerializer,
     InvoiceSerializer,
 )
-from src.models import Request, User, Invoice
-from rest_framework import status, viewsets
+from src.archive import ArchiveReadMixin
+from src.cache import ALL, ResponseCacheMixin, stats
+from src.concurrency import OptimisticConcurrencyMixin
+from src.changes import decode_token, encode_token, read_changes, visible_changes
+from src.db_queries import get_customer_billing_summary
+from src.models import (
+    ArchivedInvoice,
+    ArchivedRequest,
+    Change,
+    Request,
+    User,
+    Invoice,
+)
+from src.filters import FacetFilterBackend, FullTextSearchFilter
+from src.instrumentation import (
+    InstrumentedGenericViewMixin,
+    InstrumentedViewMixin,
+    phase,
+)
+from src.listing import FastListMixin
+from src.export import INVOICE_FIELDS, REQUEST_FIELDS
+from src.mixins import BulkModelMixin, ExportMixin, FacetsMixin
+from src.pagination import KeysetPaginationMixin
+from src.routers import use_primary
+from django.db import transaction
+from django.utils.http import quote_etag
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.fields import empty
 from rest_framework.generics import CreateAPIView
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework.filters import SearchFilter
-from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 logger = logging.getLogger(__name__)
 
 
-class RegistrationView(CreateAPIView):
+class RegistrationView(InstrumentedGenericViewMixin, CreateAPIView):
     permission_classes = (AllowAny,)
     serializer_class = RegistrationSerializer
 
 
-class MyTokenLoginView(TokenObtainPairView):
-    serializer_class = TokenObtainPairSerializer
+class MyTokenLoginView(InstrumentedGenericViewMixin, TokenObtainPairView):
+    serializer_class = MyTokenLoginSerializer
 
 
-class MyTokenLogoutView(CreateAPIView):
+class MyTokenLogoutView(InstrumentedGenericViewMixin, CreateAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = MyTokenLogoutSerializer
 
 
-class RequestsAPISet(viewsets.ModelViewSet):
+class ResponseCacheStatsView(InstrumentedViewMixin, APIView):
+    """Response cache hits and misses counted by this worker process"""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        total = stats["hit"] + stats["miss"]
+        return Response(
+            {
+                "hit": stats["hit"],
+                "miss": stats["miss"],
+                "hit_ratio": stats["hit"] / total if total else None,
+            }
+        )
+
+
+class SyncView(InstrumentedViewMixin, APIView):
+    """
+    Requests and invoices created, changed or deleted since ``?since=<token>``.
+    Call without ``since`` for everything, then keep passing the returned
+    ``next`` token; repeat at once while ``has_more`` is true. The ETag only
+    changes with the changes read, so an idle poll with ``If-None-Match`` gets
+    a 304.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    default_limit = 500
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        since = decode_token(request.query_params.get("since"))
+        limit = serializers.IntegerField(
+            min_value=1, max_value=self.max_limit, default=self.default_limit
+        ).run_validation(request.query_params.get("limit", empty))
+        # A lagging replica could show a later change before an earlier one
+        # and the transaction horizon would not cover it; read the primary.
+        with use_primary():
+            upserts, deletes, position, has_more = read_changes(
+                visible_changes(request.user), since, limit
+            )
+
+            requests = Request.objects.all()
+            if request.user.role != User.Roles.MASTER:
+                requests = requests.filter(customer_id=request.user.id)
+            request_rows, deleted_requests = self.resolve(
+                requests, upserts[Change.Kinds.REQUEST], deletes[Change.Kinds.REQUEST]
+            )
+            invoice_rows, deleted_invoices = self.resolve(
+                Invoice.objects.all(),
+                upserts[Change.Kinds.INVOICE],
+                deletes[Change.Kinds.INVOICE],
+            )
+        with phase("serialize"):
+            request_data = RequestsSerializer(request_rows, many=True).data
+            invoice_data = InvoiceSerializer(invoice_rows, many=True).data
+        response = Response(
+            {
+                "requests": request_data,
+                "invoices": invoice_data,
+                "deleted": {"requests": deleted_requests, "invoices": deleted_invoices},
+                "next": encode_token(position),
+                "has_more": has_more,
+            }
+        )
+        # The token embeds its issue time, so the body differs on every call
+        user = request.user
+        response["ETag"] = quote_etag(
+            f"{user.pk}.{user.token_version}.{since[0]}.{since[1]}.{limit}"
+            f".{position[0]}.{position[1]}.{int(has_more)}"
+        )
+        return response
+
+    @staticmethod
+    def resolve(queryset, upsert_ids, delete_ids):
+        """
+        Load the rows to upsert in one query. Rows gone since their change count
+        as deleted, tombstoned rows still visible to the caller (a request moved
+        between two customers, seen by a master) are left out.
+        """
+        rows = list(queryset.filter(pk__in=[*upsert_ids, *delete_ids]).order_by("pk"))
+        upserts = set(upsert_ids)
+        found = {row.pk for row in rows}
+        deleted = [pk for pk in delete_ids if pk not in found]
+        deleted += [pk for pk in upsert_ids if pk not in found]
+        return [row for row in rows if row.pk in upserts], sorted(deleted)
+
+
+class RequestsAPISet(
+    InstrumentedGenericViewMixin,
+    ResponseCacheMixin,
+    OptimisticConcurrencyMixin,
+    ArchiveReadMixin,
+    FastListMixin,
+    BulkModelMixin,
+    ExportMixin,
+    FacetsMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
     permission_classes = (IsAuthenticated,)
     serializer_class = RequestsSerializer
     queryset = Request.objects.all()
+    archive_model = ArchivedRequest
     http_method_names = ["get", "post", "put", "delete"]
-    filter_backends = [SearchFilter, DjangoFilterBackend]
+    filter_backends = [FullTextSearchFilter, FacetFilterBackend]
     filterset_fields = ['phone_model', 'customer', 'status']
     search_fields = ['problem_description']
+    facet_fields = ["status", "phone_model"]
+    bulk_update_fields = ["status", "phone_model", "problem_description", "customer"]
+    export_fields = REQUEST_FIELDS
 
     def filter_queryset(self, queryset):
         if self.request.user.role == User.Roles.MASTER:
-            return super().get_queryset()
+            return super().filter_queryset(queryset)
         return super().filter_queryset(
-            self.queryset.filter(customer_id=self.request.user.id)
+            queryset.filter(customer_id=self.request.user.id)
         )
 
+    def get_response_cache_scope(self):
+        if self.request.user.role == User.Roles.MASTER:
+            return ALL
+        return self.request.user.id
+
     def create(self, request, *args, **kwargs):
         request.data.setdefault("customer", request.user.id)
         serializer = self.get_serializer(data=request.data)
@@ -72,6 +205,14 @@ class RequestsAPISet(viewsets.ModelViewSet):
         logger.debug(msg="request updated")
         return Response(serializer.data)
 
+    def prepare_bulk_item(self, item):
+        item.setdefault("customer", self.request.user.id)
+        return item
+
+    def prefetch_bulk_related(self, items):
+        items = [self.prepare_bulk_item(item) for item in items]
+        return {"customer": RequestsSerializer.referenced_customers(items)}
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if (
@@ -85,12 +226,30 @@ class RequestsAPISet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class InvoiceAPISet(viewsets.ModelViewSet):
+class InvoiceAPISet(
+    InstrumentedGenericViewMixin,
+    ResponseCacheMixin,
+    OptimisticConcurrencyMixin,
+    ArchiveReadMixin,
+    FastListMixin,
+    BulkModelMixin,
+    ExportMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
     permission_classes = (IsAdminUser,)
     serializer_class = InvoiceSerializer
     queryset = Invoice.objects.all()
+    archive_model = ArchivedInvoice
     http_method_names = ["get", "post", "put", "delete"]
+    bulk_update_fields = ["price", "status", "request"]
+    export_fields = INVOICE_FIELDS
+
+    @transaction.atomic
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
@@ -104,3 +263,21 @@ class InvoiceAPISet(viewsets.ModelViewSet):
                 instance._prefetched_objects_cache = {}
             return Response(serializer.data)
         return Response({"Attention": "Invoice was not paid\n Decline!"})
+
+    def prefetch_bulk_related(self, items):
+        return {"request": InvoiceSerializer.referenced_requests(items)}
+
+    def check_bulk_update(self, instance, item):
+        if instance.status != Invoice.Statuses.UNPAID:
+            return "Paid invoice cannot be changed."
+        return super().check_bulk_update(instance, item)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def summary(self, request, *args, **kwargs):
+        """Invoice count and total per status of the caller, or of ?customer= for staff"""
+        customer_id = request.user.id
+        if request.user.is_staff and "customer" in request.query_params:
+            customer_id = serializers.IntegerField().run_validation(
+                request.query_params["customer"]
+            )
+        return Response(get_customer_billing_summary(customer_id))
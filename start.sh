@@ -1,4 +1,10 @@
 #!/usr/bin/env bash
 python manage.py migrate
+python manage.py generate_schema
+python manage.py collectstatic --noinput
 echo "from django.contrib.auth import get_user_model; get_user_model().objects.create_superuser('+380801112233', 'pass')" | python manage.py shell
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+if [ "$SERVER_MODE" = "dev" ]; then
+    python manage.py runserver 0.0.0.0:8000
+else
+    exec gunicorn --config gunicorn.conf.py
+fi